@@ -0,0 +1,219 @@
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tracemalloc
+from browser_stub import stub_browser_driver
+
+# Offline parser benchmarks over the recorded pages in fixtures/.
+# No network and no browser: every benchmark parses HTML already on disk.
+#
+#     python benchmarks.py                    # compare against fixtures/bench_baseline.json
+#     python benchmarks.py --update-baseline  # record a new baseline on this machine
+#
+# A benchmark regresses when its items/sec drops, or its peak allocation grows,
+# by more than --threshold (default 25%) against the baseline.
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+BASELINE_PATH = os.path.join(FIXTURES, "bench_baseline.json")
+DEFAULT_THRESHOLD = float(os.getenv("BENCH_THRESHOLD", 0.25))
+MIN_SECONDS = float(os.getenv("BENCH_MIN_SECONDS", 1.0))  # time budget per benchmark
+
+
+def _read(*parts):
+    with open(os.path.join(FIXTURES, *parts), "r", encoding="utf-8") as f:
+        return f.read()
+
+
+# Each setup returns (run, description); run() parses once and returns the number of items
+
+def setup_visions_extract_product_data():
+    from bs4 import BeautifulSoup
+    from checkscrape import extract_product_data
+    html = _read("visions", "grid.html")
+
+    def run():
+        soup = BeautifulSoup(html, "html.parser")
+        tiles = soup.select("li.item.product.product-item")
+        return sum(1 for tile in tiles if extract_product_data(tile, "Television", None))
+    return run, "checkscrape.extract_product_data (bs4, per tile)"
+
+
+def setup_visions_parse_product_grid():
+    from visions_parser import parse_product_grid
+    html = _read("visions", "grid.html")
+    return (lambda: sum(1 for _ in parse_product_grid(html, "Television"))), "visions_parser.parse_product_grid"
+
+
+def setup_visions_upc():
+    from upc import parse_upc
+    html = _read("visions_pdp", "product.html")
+    return (lambda: 1 if parse_upc(html) else 0), "upc.parse_upc (product page)"
+
+
+def setup_shoppers_grid():
+    from shoppersdrugmart import parse_product_grid
+    html = _read("shoppers", "grid.html")
+    return (lambda: len(parse_product_grid(html))), "shoppersdrugmart.parse_product_grid"
+
+
+def setup_shoppers_pdp():
+    from shoppersdrugmart import parse_product_page
+    html = _read("shoppers", "pdp.html")
+    url = "https://shop.shoppersdrugmart.ca/webber-melatonin-extra-strength-quick-dissolve-5-mg/p/BB_625273036466"
+    return (lambda: 1 if parse_product_page(html, url)["title"] else 0), "shoppersdrugmart.parse_product_page"
+
+
+def setup_shoppers_pdp_structured():
+    from shoppersdrugmart import parse_structured_data
+    html = _read("shoppers", "pdp.html")
+    url = "https://shop.shoppersdrugmart.ca/webber-melatonin-extra-strength-quick-dissolve-5-mg/p/BB_625273036466"
+    return (lambda: 1 if parse_structured_data(html, url) else 0), "shoppersdrugmart.parse_structured_data (JSON-LD)"
+
+
+def setup_canadacomputers_page():
+    from canadacomputers import parse_page
+    html = _read("canadacomputers", "page.html")
+    return (lambda: len(parse_page(html))), "canadacomputers.parse_page (ajax page)"
+
+
+BENCHMARKS = {
+    "visions_extract_product_data": setup_visions_extract_product_data,
+    "visions_parse_product_grid": setup_visions_parse_product_grid,
+    "visions_upc": setup_visions_upc,
+    "shoppers_grid": setup_shoppers_grid,
+    "shoppers_pdp": setup_shoppers_pdp,
+    "shoppers_pdp_structured": setup_shoppers_pdp_structured,
+    "canadacomputers_page": setup_canadacomputers_page,
+}
+
+
+def measure(run, min_seconds=MIN_SECONDS):
+    """Time run() repeatedly for about min_seconds, then trace the allocations of one extra call."""
+    items = run()  # warm-up (imports, caches)
+    if not items:
+        raise RuntimeError("parsed no items from the fixture")
+
+    iterations = 0
+    total_items = 0
+    started = time.perf_counter()
+    while True:
+        total_items += run()
+        iterations += 1
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_seconds:
+            break
+
+    tracemalloc.start()
+    try:
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "items_per_call": items,
+        "calls": iterations,
+        "items_per_sec": round(total_items / elapsed, 1),
+        "ms_per_call": round(elapsed / iterations * 1000, 3),
+        "peak_kb_per_call": round(peak / 1024, 1),
+    }
+
+
+def run_benchmarks(names, min_seconds=MIN_SECONDS):
+    stub_browser_driver()
+    results = {}
+    for name in names:
+        try:
+            run, description = BENCHMARKS[name]()
+        except ImportError as e:
+            results[name] = {"skipped": f"missing dependency: {e.name}"}
+            continue
+        results[name] = dict(measure(run, min_seconds), description=description)
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Return a list of regression messages (empty when everything is within threshold)."""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        if "skipped" in result:
+            # a benchmark with a baseline must keep running, or the gate silently stops covering it
+            regressions.append(f"{name}: {result['skipped']}")
+            continue
+        if result["items_per_sec"] < base["items_per_sec"] * (1 - threshold):
+            regressions.append(
+                f"{name}: {result['items_per_sec']:.0f} items/sec vs baseline {base['items_per_sec']:.0f}"
+            )
+        if result["peak_kb_per_call"] > base["peak_kb_per_call"] * (1 + threshold):
+            regressions.append(
+                f"{name}: peak {result['peak_kb_per_call']:.0f} KB/call vs baseline {base['peak_kb_per_call']:.0f}"
+            )
+    return regressions
+
+
+def print_results(results, baseline):
+    print(f"{'benchmark':<30} {'items/sec':>12} {'baseline':>12} {'ms/call':>10} {'peak KB':>10}")
+    for name, result in results.items():
+        if "skipped" in result:
+            print(f"{name:<30} skipped ({result['skipped']})")
+            continue
+        base = baseline.get(name, {}).get("items_per_sec")
+        print(
+            f"{name:<30} {result['items_per_sec']:>12.0f} {base if base is not None else '-':>12} "
+            f"{result['ms_per_call']:>10.3f} {result['peak_kb_per_call']:>10.1f}"
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline parser benchmarks on recorded fixtures.")
+    parser.add_argument("names", nargs="*", help=f"benchmarks to run (default: all of {', '.join(BENCHMARKS)})")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="allowed slowdown, e.g. 0.25")
+    parser.add_argument("--seconds", type=float, default=MIN_SECONDS, help="time budget per benchmark")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true", help="store these results as the baseline")
+    args = parser.parse_args(argv)
+
+    unknown = set(args.names) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(sorted(unknown))}")
+
+    results = run_benchmarks(args.names or list(BENCHMARKS), args.seconds)
+
+    try:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            stored = json.load(f)
+    except FileNotFoundError:
+        stored = {}
+    baseline = stored.get("benchmarks", {})
+    print_results(results, baseline)
+
+    if args.update_baseline:
+        measured = {name: r for name, r in results.items() if "skipped" not in r}
+        stored = {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "benchmarks": {**baseline, **measured},
+        }
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(stored, f, indent=2)
+            f.write("\n")
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print(f"\nRegressions beyond {args.threshold:.0%}:")
+        for message in regressions:
+            print(f"  {message}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,112 @@
+import os
+import time
+import logging
+from DrissionPage import ChromiumPage
+import resource_blocking
+
+# Recycling thresholds
+RECYCLE_PAGES = int(os.getenv("BROWSER_RECYCLE_PAGES", 25))
+RECYCLE_MB = float(os.getenv("BROWSER_RECYCLE_MB", 1500))
+
+
+def process_tree_rss_mb(pid):
+    """Resident memory (MB) of a process and all its descendants, read from /proc. None if unavailable."""
+    try:
+        children = {}
+        for entry in os.listdir("/proc"):
+            if not entry.isdigit():
+                continue
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+                children.setdefault(ppid, []).append(int(entry))
+            except (OSError, IndexError, ValueError):
+                continue
+
+        total_kb = 0
+        stack = [pid]
+        while stack:
+            current = stack.pop()
+            stack.extend(children.get(current, []))
+            try:
+                with open(f"/proc/{current}/status") as f:
+                    for line in f:
+                        if line.startswith("VmRSS:"):
+                            total_kb += int(line.split()[1])
+                            break
+            except OSError:
+                continue
+        return total_kb / 1024
+    except OSError:
+        return None
+
+
+class BrowserSession:
+    """
+    Keeps one warm ChromiumPage across many page loads and restarts it after
+    `recycle_pages` pages or once the browser tree uses more than `recycle_mb` MB.
+    Records startup and per-page timings so the saving is measurable.
+    """
+
+    def __init__(self, options=None, recycle_pages=RECYCLE_PAGES, recycle_mb=RECYCLE_MB, block_profile=None):
+        self.options = options
+        self.block_profile = block_profile
+        self.recycle_pages = recycle_pages
+        self.recycle_mb = recycle_mb
+        self.page = None
+        self.pages_served = 0
+        self.startup_times = []
+        self.page_times = []
+        self._page_started = None
+
+    def acquire(self) -> ChromiumPage:
+        """Return the warm browser, starting one if needed."""
+        if self.page is None:
+            started = time.monotonic()
+            self.page = ChromiumPage(addr_or_opts=self.options) if self.options else ChromiumPage()
+            if self.block_profile:
+                resource_blocking.enable(self.page, self.block_profile)
+            self.startup_times.append(time.monotonic() - started)
+            self.pages_served = 0
+            logging.info(f"Browser started in {self.startup_times[-1]:.2f}s")
+        self._page_started = time.monotonic()
+        return self.page
+
+    def release(self):
+        """Mark the current page done; recycle the browser if a threshold is hit."""
+        if self._page_started is not None:
+            self.page_times.append(time.monotonic() - self._page_started)
+            self._page_started = None
+        self.pages_served += 1
+
+        if self.pages_served >= self.recycle_pages:
+            logging.info(f"Recycling browser after {self.pages_served} pages")
+            self.close()
+            return
+        rss = process_tree_rss_mb(self.page.process_id) if self.page is not None else None
+        if rss is not None and rss > self.recycle_mb:
+            logging.info(f"Recycling browser at {rss:.0f} MB")
+            self.close()
+
+    def close(self):
+        if self.page is not None:
+            try:
+                self.page.quit()
+            finally:
+                self.page = None
+
+    def log_timings(self):
+        startups = len(self.startup_times)
+        pages = len(self.page_times)
+        logging.info(
+            f"Browser session: {startups} startups ({sum(self.startup_times):.1f}s total, "
+            f"{sum(self.startup_times) / startups if startups else 0:.2f}s avg), "
+            f"{pages} pages ({sum(self.page_times) / pages if pages else 0:.2f}s avg per page)"
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        self.log_timings()
@@ -0,0 +1,15 @@
+import sys
+import types
+
+# Offline stand-in for DrissionPage, shared by the tests (conftest.py) and benchmarks.py.
+# The parsers they exercise never drive a browser, but their modules import it at the top.
+
+
+def stub_browser_driver():
+    """Register an empty DrissionPage module when the real one isn't installed."""
+    try:
+        import DrissionPage  # noqa: F401
+    except ImportError:
+        stub = types.ModuleType("DrissionPage")
+        stub.ChromiumPage = stub.ChromiumOptions = type("BrowserNotInstalled", (), {})
+        sys.modules["DrissionPage"] = stub
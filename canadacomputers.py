@@ -1,15 +1,33 @@
 import requests
 from parsel import Selector
-import psycopg2
-from psycopg2.extras import execute_values
-import time, random
+import time
+import asyncio
 from dotenv import load_dotenv
 import os
+import logging
+import metrics
+from http_cache import HttpCache
+from datetime import datetime, timezone
+from db import get_connection, log_stats, close_pool
+from change_detection import write_changed, log_stats as log_change_stats
+from price_history import record_observations
 
 
 load_dotenv()
 
-BASE_URL = "https://www.canadacomputers.com/en/clearance"
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+)
+
+BASE_URL = os.getenv("CC_BASE_URL", "https://www.canadacomputers.com/en/clearance")
+REQUEST_TIMEOUT = float(os.getenv("CC_REQUEST_TIMEOUT", 20))
+CONCURRENCY = int(os.getenv("CC_CONCURRENCY", 4))
+RATE_LIMIT = float(os.getenv("CC_RATE_LIMIT", 2))  # requests/sec
+MAX_ERRORS = int(os.getenv("CC_MAX_ERRORS", 5))  # give up after this many failed pages
+FETCH_RETRIES = int(os.getenv("CC_FETCH_RETRIES", 3))  # extra attempts per page before it counts as failed
+RETRY_BACKOFF = float(os.getenv("CC_RETRY_BACKOFF", 1))  # seconds before the first retry, doubled after each
+HTTP_CACHE = os.getenv("CC_HTTP_CACHE", "true").lower() == "true"  # conditional requests, skip unchanged pages
 HEADERS = {
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:143.0) Gecko/20100101 Firefox/143.0",
     "Accept-Language": "en-US,en;q=0.9",
@@ -56,6 +74,12 @@ def parse_stock(value: str) -> bool:
     return str(value).strip() == "1"
 
 # Save to DB
+CC_COLUMNS = [
+    "url", "title", "brand", "model", "current_price",
+    "regular_price", "percentage_discount", "rating", "reviews",
+    "in_stock_online", "in_stock_retail", "image_url", "scraped_at",
+]
+
 def save_to_db(products):
     
     """
@@ -74,32 +98,19 @@ def save_to_db(products):
             reviews INTEGER,
             in_stock_online BOOLEAN,
             in_stock_retail BOOLEAN,
-            image_url VARCHAR(2000)
+            image_url VARCHAR(2000),
+            scraped_at TIMESTAMPTZ,
+            content_hash TEXT, -- see change_detection.py
+            CONSTRAINT canadacomputers_url UNIQUE (url)
         );
 
+        Products whose content is unchanged since the last run only get scraped_at updated.
+        Every product is also appended to price_observations.
+
     """
     
-    DATABASE_URL = os.getenv("DATABASE_URL")
-    if DATABASE_URL:
-        conn = psycopg2.connect(DATABASE_URL)
-    else:
-        conn = psycopg2.connect(
-            host=os.getenv("DB_HOST"),
-            port=os.getenv("DB_PORT", 5432),
-            dbname=os.getenv("DB_NAME"),
-            user=os.getenv("DB_USER"),
-            password=os.getenv("DB_PASS"),
-        )
-    cur = conn.cursor()
-
-    insert_query = """
-        INSERT INTO canadacomputers (
-            url, title, brand, model, current_price,
-            regular_price, percentage_discount, rating, reviews,
-            in_stock_online, in_stock_retail, image_url
-        ) VALUES %s
-    """
-
+    now = datetime.now(timezone.utc)
+    normalize_started = time.perf_counter()
     values = []
     for p in products:
         # discount %
@@ -125,21 +136,52 @@ def save_to_db(products):
             p["reviews"],
             p["in_stock_online"],
             p["in_stock_retail"],
-            p["image"]
+            p["image"],
+            now,
         ))
 
+    metrics.observe("normalize", time.perf_counter() - normalize_started, "canadacomputers")
+
     if values:
-        execute_values(cur, insert_query, values)
-        conn.commit()
+        with metrics.stage("db_write", "canadacomputers"), get_connection() as conn, conn.cursor() as cur:
+            write_changed(cur, "canadacomputers", ["url"], CC_COLUMNS, values, seen_column="scraped_at")
+            record_observations(cur, "canadacomputers", [
+                (v[0], now, v[4], v[5], v[1], None, bool(v[9] or v[10])) for v in values
+            ])
 
-    cur.close()
-    conn.close()
+def mark_seen(urls):
+    """
+    Products listed on a page that hasn't changed since the last run: bump
+    scraped_at in one UPDATE and record an observation at their stored prices,
+    without re-parsing or re-fingerprinting them.
+    """
+    urls = [u for u in dict.fromkeys(urls) if u]
+    if not urls:
+        return 0
+    now = datetime.now(timezone.utc)
+    with metrics.stage("db_write", "canadacomputers"), get_connection() as conn, conn.cursor() as cur:
+        cur.execute("""
+            UPDATE canadacomputers SET scraped_at = %s WHERE url = ANY(%s)
+            RETURNING url, current_price, regular_price, title, in_stock_online, in_stock_retail
+        """, (now, urls))
+        rows = cur.fetchall()
+        record_observations(cur, "canadacomputers", [
+            (url, now, price, regular, title, None, bool(online or retail))
+            for url, price, regular, title, online, retail in rows
+        ])
+    return len(rows)
 
 # Page Scraper
-def scrape_page(page: int):
-    url = f"{BASE_URL}?page={page}&ajaxtrue=1&onlyproducts=1"
-    resp = session.get(url)
-    html = resp.text.strip()
+def page_url(page: int, base_url: str = BASE_URL) -> str:
+    return f"{base_url}?page={page}&ajaxtrue=1&onlyproducts=1"
+
+def fetch_page(page: int, base_url: str = BASE_URL) -> str:
+    resp = session.get(page_url(page, base_url), timeout=REQUEST_TIMEOUT)
+    resp.raise_for_status()
+    return resp.text
+
+def parse_page(html: str):
+    html = html.strip()
     if not html or "js-product" not in html:
         return []
 
@@ -161,30 +203,184 @@ def scrape_page(page: int):
         products.append(data)
     return products
 
-def scrape_all():
-    page = 1
-    while True:
-        products = scrape_page(page)
-        if not products:
-            print(f"Done. No more products after page {page}")
-            break
-        save_to_db(products)
-        print(f"Saved page {page} with {len(products)} products")
-        time.sleep(random.uniform(1, 3)) # Just a little respect to the site since we're bombarding it with request ✌️, or we can remove this line 😅
-        page += 1
-
-def scrape_range(start, end):
-    for page in range(start, end + 1):
-        products = scrape_page(page)
-        if not products:
-            print(f"No products found on page {page}, stopping.")
-            break
-        save_to_db(products)
-        print(f"Saved page {page} with {len(products)} products")
-        time.sleep(random.uniform(1, 3)) # Just a little respect to the site since we're bombarding it with request ✌️, or we can remove this line 😅
+def scrape_page(page: int):
+    return parse_page(fetch_page(page))
+
+# Concurrent fetcher
+class TokenBucket:
+    """Async token bucket: allows `rate` acquisitions per second with bursts up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: float = 1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+async def scrape_pages_async(start=1, end=None, concurrency=CONCURRENCY, rate=RATE_LIMIT,
+                             base_url=BASE_URL, on_page=save_to_db, cache=None, on_seen=mark_seen):
+    """
+    Fetch pages start..end (or until the first empty page) with up to `concurrency`
+    requests in flight and at most `rate` requests/sec. Each parsed page is handed
+    to `on_page` as soon as it arrives. Returns a stats dict.
+    With an HttpCache, pages whose body is unchanged since the last run are not
+    parsed; their cached product URLs are handed to `on_seen` instead.
+    """
+    bucket = TokenBucket(rate, capacity=max(1, concurrency))
+    state = {"next": start, "last": end if end is not None else float("inf")}
+    in_flight = {}  # page -> worker task
+    latencies = []
+    stats = {"pages": 0, "products": 0, "errors": 0, "retries": 0, "failed_pages": [],
+             "unchanged_pages": 0, "unchanged_products": 0}
+
+    async def fetch(page):
+        """Fetch one page, retrying transient failures with backoff (each retry takes a new token)."""
+        for attempt in range(FETCH_RETRIES + 1):
+            try:
+                if cache is not None:
+                    cached = await asyncio.to_thread(cache.get, session, page_url(page, base_url), REQUEST_TIMEOUT)
+                    return cached.text, cached
+                return await asyncio.to_thread(fetch_page, page, base_url), None
+            except requests.RequestException as e:
+                status = e.response.status_code if e.response is not None else None
+                if attempt == FETCH_RETRIES or (status is not None and 400 <= status < 500 and status != 429):
+                    raise
+                stats["retries"] += 1
+                metrics.count("fetch_retries", "canadacomputers")
+                print(f"Retrying page {page} after error: {e}")
+                await asyncio.sleep(RETRY_BACKOFF * 2 ** attempt)
+                await bucket.acquire()
+
+    def page_failed(page, error, stage):
+        stats["errors"] += 1
+        stats["failed_pages"].append(page)
+        metrics.count(f"{stage}_errors", "canadacomputers")
+        print(f"Error {'fetching' if stage == 'fetch' else 'saving'} page {page}: {error}")
+        if stats["errors"] >= MAX_ERRORS:
+            state["last"] = min(state["last"], page)
+
+    async def worker():
+        while True:
+            page = state["next"]
+            if page > state["last"]:
+                return
+            state["next"] += 1
+            await bucket.acquire()
+            if page > state["last"]:
+                return
+
+            in_flight[page] = asyncio.current_task()
+            started = time.monotonic()
+            try:
+                html, cached = await fetch(page)
+            except Exception as e:
+                page_failed(page, e, "fetch")
+                continue
+            finally:
+                in_flight.pop(page, None)
+            latencies.append(time.monotonic() - started)
+            metrics.observe("page_load", latencies[-1], "canadacomputers")
+
+            if cached is not None and cached.unchanged:
+                if cached.items:
+                    try:
+                        await asyncio.to_thread(on_seen, cached.urls)
+                    except Exception as e:
+                        page_failed(page, e, "save")
+                        continue
+                    stats["unchanged_pages"] += 1
+                    stats["unchanged_products"] += cached.items
+                    metrics.count("unchanged_pages", "canadacomputers")
+                    print(f"Page {page} unchanged since last run ({cached.items} products), marked seen")
+                    continue
+                products = []  # same empty page as last run
+            else:
+                with metrics.stage("extract", "canadacomputers"):
+                    products = parse_page(html)
+            if not products:
+                if cached is not None:
+                    cache.commit(cached, [])
+                # Past the last page: stop scheduling and drop requests beyond it
+                state["last"] = min(state["last"], page - 1)
+                for other, task in list(in_flight.items()):
+                    if other > state["last"]:
+                        task.cancel()
+                return
+
+            try:
+                await asyncio.to_thread(on_page, products)
+            except Exception as e:
+                page_failed(page, e, "save")  # not committed to the cache, so it is fetched again next run
+                continue
+            if cached is not None:
+                cache.commit(cached, [p["url"] for p in products])
+            stats["pages"] += 1
+            stats["products"] += len(products)
+            metrics.count("items", "canadacomputers", amount=len(products))
+            print(f"Saved page {page} with {len(products)} products")
+
+    started = time.monotonic()
+    workers = [asyncio.create_task(worker()) for _ in range(max(1, concurrency))]
+    for result in await asyncio.gather(*workers, return_exceptions=True):
+        if isinstance(result, Exception):
+            logging.error(f"Canada Computers fetch worker stopped: {result!r}")
+            stats["errors"] += 1
+    elapsed = time.monotonic() - started
+    if end is None:
+        print(f"Done. No more products after page {state['last']}")
+
+    stats.update({
+        "seconds": elapsed,
+        "pages_per_sec": stats["pages"] / elapsed if elapsed else 0.0,
+        "p50_latency": percentile(latencies, 50),
+        "p95_latency": percentile(latencies, 95),
+    })
+    print(
+        f"Fetched {stats['pages']} pages ({stats['products']} products, {stats['errors']} errors, "
+        f"{stats['unchanged_pages']} unchanged pages skipped) "
+        f"in {elapsed:.1f}s: {stats['pages_per_sec']:.2f} pages/sec, "
+        f"p50 {stats['p50_latency']:.2f}s, p95 {stats['p95_latency']:.2f}s"
+    )
+    if stats["failed_pages"]:
+        stats["failed_pages"].sort()
+        print(f"Pages that failed after {FETCH_RETRIES} retries: {', '.join(map(str, stats['failed_pages']))}")
+    return stats
+
+def run_with_cache(start, end, concurrency, rate):
+    cache = HttpCache() if HTTP_CACHE else None
+    try:
+        return asyncio.run(scrape_pages_async(start=start, end=end, concurrency=concurrency, rate=rate, cache=cache))
+    finally:
+        if cache is not None:
+            cache.log_stats()
+            cache.close()
+
+def scrape_all(concurrency=CONCURRENCY, rate=RATE_LIMIT):
+    return run_with_cache(1, None, concurrency, rate)
+
+def scrape_range(start, end, concurrency=CONCURRENCY, rate=RATE_LIMIT):
+    return run_with_cache(start, end, concurrency, rate)
     
 
 if __name__ == "__main__":
+    metrics.start()
     choice = input("Choose an option:\n[1] Scrape ALL pages\n[2] Scrape page or range (e.g. 1-4)\n> ").strip()
     if choice == "1":
         print("Scraping all pages")
@@ -199,4 +395,7 @@ if __name__ == "__main__":
             scrape_range(page, page)  # single page
     else:
         print("Invalid choice. Exiting.")
+    log_change_stats()
+    log_stats()
+    close_pool()
 
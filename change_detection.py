@@ -0,0 +1,82 @@
+import json
+import hashlib
+import logging
+import threading
+from psycopg2.extras import execute_values
+
+# Content fingerprints: rows whose fingerprint didn't change are not rewritten,
+# only their "seen" timestamp is bumped in one batched UPDATE.
+#
+# Each table needs a content_hash column (and a unique key for ON CONFLICT):
+#     ALTER TABLE visions ADD COLUMN content_hash TEXT;
+#     ALTER TABLE shoppersdrugmart ADD COLUMN content_hash TEXT;
+#     ALTER TABLE canadacomputers ADD COLUMN content_hash TEXT;
+
+_lock = threading.Lock()
+stats = {}  # table -> {"new", "changed", "unchanged"}
+
+
+def content_hash(values) -> str:
+    """Stable fingerprint of a row's normalized content fields."""
+    payload = json.dumps(list(values), default=str, separators=(",", ":"))
+    return hashlib.md5(payload.encode("utf-8")).hexdigest()
+
+
+def _count(table, new, changed, unchanged):
+    with _lock:
+        s = stats.setdefault(table, {"new": 0, "changed": 0, "unchanged": 0})
+        s["new"] += new
+        s["changed"] += changed
+        s["unchanged"] += unchanged
+
+
+def write_changed(cur, table, key_columns, columns, rows, seen_column, page_size=250):
+    """
+    Upsert only new or changed rows, then mark the unchanged ones as seen.
+
+    columns includes key_columns and seen_column; each row is a tuple in that order.
+    The fingerprint covers every column except seen_column. Duplicate keys in
+    `rows` collapse to the last occurrence. Returns (new, changed, unchanged).
+    """
+    key_idx = [columns.index(c) for c in key_columns]
+    seen_idx = columns.index(seen_column)
+    content_idx = [i for i in range(len(columns)) if i != seen_idx]
+
+    by_key = {}
+    for row in rows:
+        by_key[tuple(row[i] for i in key_idx)] = row
+    if not by_key:
+        return 0, 0, 0
+    values = [row + (content_hash(row[i] for i in content_idx),) for row in by_key.values()]
+
+    cols = ", ".join(columns)
+    keys = ", ".join(key_columns)
+    updates = ", ".join(f"{c}=EXCLUDED.{c}" for c in columns + ["content_hash"] if c not in key_columns)
+    written = execute_values(cur, f"""
+        INSERT INTO {table} ({cols}, content_hash) VALUES %s
+        ON CONFLICT ({keys}) DO UPDATE SET {updates}
+        WHERE {table}.content_hash IS DISTINCT FROM EXCLUDED.content_hash
+        RETURNING {keys}, (xmax = 0) AS inserted
+    """, values, page_size=page_size, fetch=True)
+
+    new = sum(1 for row in written if row[-1])
+    changed = len(written) - new
+    written_keys = {tuple(row[:-1]) for row in written}
+
+    unchanged = [key + (by_key[key][seen_idx],) for key in by_key if key not in written_keys]
+    if unchanged:
+        match = " AND ".join(f"t.{c} = v.{c}" for c in key_columns)
+        execute_values(cur, f"""
+            UPDATE {table} AS t SET {seen_column} = CAST(v.seen AS timestamptz)
+            FROM (VALUES %s) AS v({keys}, seen)
+            WHERE {match}
+        """, unchanged, page_size=page_size)
+
+    _count(table, new, changed, len(unchanged))
+    return new, changed, len(unchanged)
+
+
+def log_stats():
+    with _lock:
+        for table, s in sorted(stats.items()):
+            logging.info(f"{table}: {s['new']} new, {s['changed']} changed, {s['unchanged']} unchanged")
@@ -0,0 +1,274 @@
+import os
+import sys
+import json
+import time
+import logging
+import threading
+from psycopg2.extras import Json
+from db import get_connection, close_pool
+
+# Append-only checkpoint journal for resumable scrapes.
+#
+# The file is one JSON record per line: a "snapshot" with the full state,
+# followed by small "progress"/"done" records. Appends are fsynced in batches;
+# finishing a category compacts the file back into a single snapshot.
+#
+# The journal is the fast local copy. The authoritative resume point is the
+# scrape_progress table (SCHEMA below), written in the same transaction as each
+# product batch. ensure_schema() creates it on first use; `python
+# checkpoint_journal.py init` creates it up front.
+
+JOURNAL_FSYNC_EVERY = int(os.getenv("CHECKPOINT_FSYNC_EVERY", 20))  # records per fsync
+JOURNAL_FSYNC_SECONDS = float(os.getenv("CHECKPOINT_FSYNC_SECONDS", 2))  # max time between fsyncs
+ITEMS_DIR = os.getenv("CHECKPOINT_ITEMS_DIR", "checkpoint_items")  # extracted lists of in-progress categories
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scrape_progress (
+    run_id TEXT NOT NULL,
+    category_id INTEGER NOT NULL,
+    product_index INTEGER NOT NULL DEFAULT 0,  -- products committed so far
+    done BOOLEAN NOT NULL DEFAULT FALSE,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (run_id, category_id)
+);
+CREATE TABLE IF NOT EXISTS scrape_items (  -- extracted lists of queued categories, readable from any host
+    run_id TEXT NOT NULL,
+    category_id INTEGER NOT NULL,
+    items JSONB NOT NULL,
+    saved_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (run_id, category_id)
+);
+"""
+
+_schema_lock = threading.Lock()
+_schema_ready = False
+
+
+class CheckpointJournal:
+    def __init__(self, path, fsync_every=JOURNAL_FSYNC_EVERY, fsync_seconds=JOURNAL_FSYNC_SECONDS):
+        self.path = path
+        self.fsync_every = fsync_every
+        self.fsync_seconds = fsync_seconds
+        self._fd = None
+        self._pending = 0
+        self._last_sync = time.monotonic()
+
+    @staticmethod
+    def read(path):
+        """Replay a journal into a state dict, or None if there is no usable snapshot."""
+        state = None
+        try:
+            with open(path, "r") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        break  # torn write at the tail
+                    if record.get("type") == "snapshot":
+                        state = record["state"]
+                    elif state is not None:
+                        apply_record(state, record)
+        except FileNotFoundError:
+            return None
+        return state
+
+    def compact(self, state):
+        """Replace the journal with a single snapshot of `state`."""
+        self.close()
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            f.write(json.dumps({"type": "snapshot", "state": state}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        self._fsync_dir()
+        self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND)
+
+    def append(self, record):
+        if self._fd is None:
+            self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        os.write(self._fd, (json.dumps(record, separators=(",", ":")) + "\n").encode("utf-8"))
+        self._pending += 1
+        if self._pending >= self.fsync_every or time.monotonic() - self._last_sync >= self.fsync_seconds:
+            self.sync()
+
+    def sync(self):
+        if self._fd is not None and self._pending:
+            os.fsync(self._fd)
+        self._pending = 0
+        self._last_sync = time.monotonic()
+
+    def close(self):
+        if self._fd is not None:
+            self.sync()
+            os.close(self._fd)
+            self._fd = None
+
+    def remove(self):
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def _fsync_dir(self):
+        try:
+            fd = os.open(os.path.dirname(os.path.abspath(self.path)), os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+
+def apply_record(state, record):
+    """Apply one "progress" or "done" record to a checkpoint state."""
+    entry = state["progress"].setdefault(str(record["category"]), {"product_index": 0, "done": False})
+    if record["type"] == "progress":
+        entry["product_index"] = max(entry["product_index"], record["index"])
+    elif record["type"] == "done":
+        entry["done"] = True
+
+
+# Extracted item lists, so a resume continues from the same list instead of re-scraping
+
+def _items_path(run_id, category_id, directory=ITEMS_DIR):
+    return os.path.join(directory, f"{run_id}_{category_id}.json")
+
+
+def save_items(run_id, category_id, items, directory=ITEMS_DIR):
+    """Persist the extracted list for a category (temp file + os.replace)."""
+    os.makedirs(directory, exist_ok=True)
+    path = _items_path(run_id, category_id, directory)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(items, f, separators=(",", ":"))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def load_items(run_id, category_id, directory=ITEMS_DIR):
+    """The list saved by save_items, or None if there is none (or it is unreadable)."""
+    try:
+        with open(_items_path(run_id, category_id, directory), "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def drop_items(run_id, category_id, directory=ITEMS_DIR):
+    try:
+        os.remove(_items_path(run_id, category_id, directory))
+    except FileNotFoundError:
+        pass
+
+
+def clear_items(run_id, directory=ITEMS_DIR):
+    if not os.path.isdir(directory):
+        return
+    for name in os.listdir(directory):
+        if name.startswith(f"{run_id}_"):
+            os.remove(os.path.join(directory, name))
+
+
+# Extracted lists shared through Postgres, for categories handed out by the work queue
+
+def save_shared_items(run_id, category_id, items):
+    """
+    Store a freshly extracted list and reset the category's committed position in
+    the same transaction: an index only ever refers to the list stored next to it.
+    """
+    with get_connection() as conn, conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO scrape_items (run_id, category_id, items, saved_at) VALUES (%s, %s, %s, now())
+            ON CONFLICT (run_id, category_id) DO UPDATE SET items = EXCLUDED.items, saved_at = now()
+        """, (run_id, category_id, Json(items)))
+        cur.execute("""
+            INSERT INTO scrape_progress (run_id, category_id, product_index, done, updated_at)
+            VALUES (%s, %s, 0, FALSE, now())
+            ON CONFLICT (run_id, category_id) DO UPDATE SET product_index = 0, done = FALSE, updated_at = now()
+        """, (run_id, category_id))
+
+
+def load_shared_items(run_id, category_id):
+    with get_connection() as conn, conn.cursor() as cur:
+        cur.execute("SELECT items FROM scrape_items WHERE run_id = %s AND category_id = %s", (run_id, category_id))
+        row = cur.fetchone()
+    return row[0] if row else None
+
+
+def drop_shared_items(run_id, category_id):
+    with get_connection() as conn, conn.cursor() as cur:
+        cur.execute("DELETE FROM scrape_items WHERE run_id = %s AND category_id = %s", (run_id, category_id))
+
+
+# Progress committed with the product rows
+
+def ensure_schema():
+    """Create scrape_progress and scrape_items if they don't exist yet (once per process)."""
+    global _schema_ready
+    if _schema_ready:
+        return
+    with _schema_lock:
+        if not _schema_ready:
+            with get_connection() as conn, conn.cursor() as cur:
+                cur.execute(SCHEMA)
+            _schema_ready = True
+
+
+def record_progress(cur, run_id, category_id, product_index, done=False):
+    """Store a category's committed position on the caller's cursor (same transaction as the batch)."""
+    cur.execute("""
+        INSERT INTO scrape_progress (run_id, category_id, product_index, done, updated_at)
+        VALUES (%s, %s, %s, %s, now())
+        ON CONFLICT (run_id, category_id) DO UPDATE SET
+            product_index = GREATEST(scrape_progress.product_index, EXCLUDED.product_index),
+            done = scrape_progress.done OR EXCLUDED.done,
+            updated_at = now()
+    """, (run_id, category_id, product_index, done))
+
+
+def mark_done(run_id, category_id):
+    with get_connection() as conn, conn.cursor() as cur:
+        record_progress(cur, run_id, category_id, 0, done=True)
+
+
+def load_progress(run_id):
+    """{category_id: {"product_index", "done"}} committed for run_id; empty if unavailable."""
+    try:
+        with get_connection() as conn, conn.cursor() as cur:
+            cur.execute(
+                "SELECT category_id, product_index, done FROM scrape_progress WHERE run_id = %s",
+                (run_id,),
+            )
+            return {str(cid): {"product_index": idx, "done": done} for cid, idx, done in cur.fetchall()}
+    except Exception as e:
+        logging.warning(f"Could not read committed progress: {e}")
+        return {}
+
+
+def clear_progress(run_id):
+    try:
+        with get_connection() as conn, conn.cursor() as cur:
+            cur.execute("DELETE FROM scrape_progress WHERE run_id = %s", (run_id,))
+    except Exception as e:
+        logging.warning(f"Could not clear committed progress: {e}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+    )
+    command = sys.argv[1] if len(sys.argv) > 1 else ""
+    try:
+        if command == "init":
+            ensure_schema()
+            logging.info("scrape_progress and scrape_items tables are ready")
+        else:
+            print("Usage: python checkpoint_journal.py init")
+            sys.exit(2)
+    finally:
+        close_pool()
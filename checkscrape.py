@@ -5,21 +5,34 @@ from dotenv import load_dotenv
 import os
 import json
 import re
-from CloudflareBypasser import CloudflareBypasser
+import queue
+import multiprocessing
+from urllib.parse import urlparse
+from clearance import ClearanceStore, ensure_clearance, log_stats as log_clearance_stats
 from DrissionPage import ChromiumPage, ChromiumOptions
-from bs4 import BeautifulSoup
-import psycopg2
+from visions_parser import (
+    extract_model, parse_product_grid, parse_product_tiles, parse_tile_records, TILE_RECORDS_JS,
+)
+import requests
+import metrics
+import resource_blocking
 from psycopg2.extras import execute_values
+from db import get_connection, log_stats, close_pool
+from change_detection import write_changed, log_stats as log_change_stats
+from price_history import record_observations
+from checkpoint_journal import (
+    CheckpointJournal, apply_record, record_progress, mark_done, load_progress, clear_progress,
+    ensure_schema as ensure_progress_schema, save_items, save_shared_items, load_shared_items, drop_shared_items, load_items, drop_items, clear_items,
+)
+from upc import UpcTabPool, UpcHttpPool, UpcCache, UPC_XPATH, UPC_TIMEOUT
+from waits import (
+    wait_until, timeout_for, count_elements, wait_for_selector,
+    wait_for_spinner_gone, wait_for_network_idle, log_wait_stats,
+)
 
 load_dotenv()
 
 # Helpers
-def extract_model(text):
-    matches = re.findall(r'\(([^()]+)\)', text)  # only matches non-nested parentheses
-    if matches:
-        return matches[-1].strip()  # take the last one
-    return "N/A"
-
 def clean_numeric(val, percent=False):
     if not val or val == "N/A":
         return None
@@ -49,20 +62,6 @@ logging.basicConfig(
 
 # Save to POSTGRES DB
 def save_to_visions(json_data):
-    DATABASE_URL = os.getenv("DATABASE_URL")
-    if DATABASE_URL:
-        conn = psycopg2.connect(DATABASE_URL)
-    else:
-        conn = psycopg2.connect(
-            host=os.getenv("DB_HOST"),
-            port=os.getenv("DB_PORT", 5432),
-            dbname=os.getenv("DB_NAME"),
-            user=os.getenv("DB_USER"),
-            password=os.getenv("DB_PASS"),
-        )
-
-    cur = conn.cursor()
-    cur.execute("TRUNCATE TABLE visions;") # Clear table visions
     now = datetime.now(timezone.utc) # UTC timestamp / make sure created_at column is TIMESTAMPTZ
     rows = []
     for item in json_data:
@@ -84,127 +83,172 @@ def save_to_visions(json_data):
             now  # created_at timestamp
         ))
 
-    # Insert or update on conflict (upsert)
-    execute_values(cur, """
-        INSERT INTO visions (
-            url, title, brand, model,
-            current_price, regular_price, percentage_discount, dollar_discount,
-            eco_fee, num_reviews, avg_rating,
-            main_category, sale_ends, upc, created_at
-        ) VALUES %s
-        """, rows)
-
+    with get_connection() as conn, conn.cursor() as cur:
+        cur.execute("TRUNCATE TABLE visions;") # Clear table visions (history is kept in price_observations)
+        record_observations(cur, "visions", [visions_observation(row) for row in rows])
 
-    conn.commit()
-    cur.close()
-    conn.close()
+        # Insert or update on conflict (upsert)
+        execute_values(cur, """
+            INSERT INTO visions (
+                url, title, brand, model,
+                current_price, regular_price, percentage_discount, dollar_discount,
+                eco_fee, num_reviews, avg_rating,
+                main_category, sale_ends, upc, created_at
+            ) VALUES %s
+            """, rows)
 
     logging.info(f"Saved {len(rows)} products to Postgres.")
 
 # Other Helpers
 
-CHECKPOINT_FILE = "checkpoint.json"
+PRODUCT_CSS = "li.item.product.product-item"
+CATEGORY_URL = "https://www.visions.ca/deals/clearance?cat={category_id}&visions_item_status=239699"
 
-def load_checkpoint(categories_to_scrape):
-    if os.path.exists(CHECKPOINT_FILE):
-        with open(CHECKPOINT_FILE, "r") as f:
-            data = json.load(f)
-            if data.get("mode") == "resume":
-                return data
-    # default: restart from scratch
-    checkpoint = {
+# "browser" renders every category; "http" only uses the browser for Cloudflare
+VISIONS_MODE = os.getenv("VISIONS_MODE", "browser").lower()
+HTTP_TIMEOUT = float(os.getenv("VISIONS_HTTP_TIMEOUT", 30))
+HTTP_MAX_PAGES = int(os.getenv("VISIONS_HTTP_MAX_PAGES", 100))
+
+# "html" ships each tile's outerHTML to Python; "js" builds compact records in the page
+EXTRACT_MODE = os.getenv("VISIONS_EXTRACT", "html").lower()
+
+CHECKPOINT_FILE = "checkpoint.json"  # old full-rewrite format, still read on resume
+CHECKPOINT_JOURNAL = os.getenv("CHECKPOINT_JOURNAL", "checkpoint.journal")
+
+def new_checkpoint(categories_to_scrape):
+    return {
         "mode": "resume",
+        "run_id": datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f"),
         "categories": [{"id": cid, "name": cname} for cid, cname in categories_to_scrape.items()],
-        "current_category_index": 0,
-        "current_product_index": 0
+        "progress": {str(cid): {"product_index": 0, "done": False} for cid in categories_to_scrape},
     }
-    save_checkpoint(checkpoint)
+
+def load_checkpoint():
+    """Read the journal (or an old checkpoint.json), or None if there is nothing to resume."""
+    checkpoint = CheckpointJournal.read(CHECKPOINT_JOURNAL)
+    if checkpoint is None and os.path.exists(CHECKPOINT_FILE):
+        with open(CHECKPOINT_FILE, "r") as f:
+            checkpoint = json.load(f)
+    if checkpoint is None:
+        return None
+    category_progress(checkpoint)
+    checkpoint.setdefault("run_id", "legacy")
     return checkpoint
 
-def save_checkpoint(data):
-    with open(CHECKPOINT_FILE, "w") as f:
-        json.dump(data, f, indent=2)
+def merge_committed_progress(checkpoint):
+    """Advance the checkpoint to what scrape_progress says was committed with the product rows."""
+    progress = category_progress(checkpoint)
+    for category_id, committed in load_progress(checkpoint["run_id"]).items():
+        entry = progress.setdefault(category_id, {"product_index": 0, "done": False})
+        entry["product_index"] = max(entry["product_index"], committed["product_index"])
+        entry["done"] = entry["done"] or committed["done"]
 
-def insert_product(product):
-    DATABASE_URL = os.getenv("DATABASE_URL")
-    if DATABASE_URL:
-        conn = psycopg2.connect(DATABASE_URL)
-    else:
-        conn = psycopg2.connect(
-            host=os.getenv("DB_HOST"),
-            port=os.getenv("DB_PORT", 5432),
-            dbname=os.getenv("DB_NAME"),
-            user=os.getenv("DB_USER"),
-            password=os.getenv("DB_PASS"),
-        )
+def category_progress(checkpoint):
+    """
+    Return the per-category progress map ({category_id: {"product_index", "done"}}),
+    converting checkpoints written with the old single category/product index.
+    """
+    if "progress" not in checkpoint:
+        cat_idx = checkpoint.pop("current_category_index", 0)
+        prod_idx = checkpoint.pop("current_product_index", 0)
+        checkpoint["progress"] = {
+            str(c["id"]): {"product_index": prod_idx if i == cat_idx else 0, "done": i < cat_idx}
+            for i, c in enumerate(checkpoint["categories"])
+        }
+    return checkpoint["progress"]
 
-    cur = conn.cursor()
+def apply_report(checkpoint, message, journal):
+    """
+    Record a ("progress", category_id, product_index) or ("done", category_id) message:
+    append it to the journal, and compact the journal when a category finishes.
+    """
+    kind, category_id = message[0], str(message[1])
+    record = {"type": kind, "category": category_id}
+    if kind == "progress":
+        record["index"] = message[2]
+    category_progress(checkpoint)
+    apply_record(checkpoint, record)
+    category_name = next((c["name"] for c in checkpoint["categories"] if str(c["id"]) == category_id), category_id)
+    with metrics.stage("checkpoint", "visions", category_name):
+        if kind == "done":
+            journal.compact(checkpoint)
+        else:
+            journal.append(record)
+
+# Products per multi-row upsert statement
+UPSERT_BATCH_SIZE = int(os.getenv("UPSERT_BATCH_SIZE", 250))
+
+def product_row(product, now):
+    """Normalize a scraped product dict into a visions row tuple."""
+    return (
+        product["url"], product["title"], product["brand"],
+        None if product["model"] == "N/A" else product["model"],
+        clean_numeric(product["current_price"]),
+        clean_numeric(product["regular_price"]),
+        clean_numeric(product["percentage_discount"], percent=True),
+        clean_numeric(product["dollar_discount"]),
+        clean_numeric(product["eco_fee"]),
+        clean_numeric(product["num_reviews"]),
+        clean_numeric(product["avg_rating"]),
+        product["main_category"],
+        parse_date(product["sale_ends"]),
+        product["upc"],
+        now
+    )
+
+VISIONS_COLUMNS = [
+    "url", "title", "brand", "model",
+    "current_price", "regular_price", "percentage_discount", "dollar_discount",
+    "eco_fee", "num_reviews", "avg_rating",
+    "main_category", "sale_ends", "upc", "created_at",
+]
+
+def visions_observation(row):
+    """price_observations tuple for a visions row."""
+    p = dict(zip(VISIONS_COLUMNS, row))
+    upc = None if p["upc"] in (None, "N/A") else p["upc"]
+    return (p["url"], p["created_at"], p["current_price"], p["regular_price"], p["title"], upc, None)
+
+def upsert_products(products, progress=None):
+    """
+    Write a batch of products with one INSERT ... ON CONFLICT statement.
+    Rows whose content fingerprint is unchanged only get created_at bumped;
+    every product is also appended to price_observations.
+    progress=(run_id, category_id, product_index, done) is stored in scrape_progress
+    in the same transaction, so the resume point never disagrees with the rows.
+
+    Requires a unique key on (url, main_category) and a content_hash column:
+        ALTER TABLE visions ADD CONSTRAINT visions_url_category_key UNIQUE (url, main_category);
+        ALTER TABLE visions ADD COLUMN content_hash TEXT;
+    """
+    if not products:
+        return 0
+    category_name = products[0].get("main_category")
     now = datetime.now(timezone.utc)
+    with metrics.stage("normalize", "visions", category_name):
+        rows = [product_row(product, now) for product in products]
 
-    # check if same URL + category exists already
-    cur.execute("""
-        SELECT id FROM visions WHERE url=%s AND main_category=%s LIMIT 1
-    """, (product["url"], product["main_category"]))
-    existing = cur.fetchone()
-
-    if existing:
-        cur.execute("""
-            UPDATE visions SET
-                title=%s, brand=%s, model=%s,
-                current_price=%s, regular_price=%s, percentage_discount=%s, dollar_discount=%s,
-                eco_fee=%s, num_reviews=%s, avg_rating=%s,
-                sale_ends=%s, upc=%s, created_at=%s
-            WHERE id=%s
-        """, (
-            product["title"], product["brand"],
-            None if product["model"] == "N/A" else product["model"],
-            clean_numeric(product["current_price"]),
-            clean_numeric(product["regular_price"]),
-            clean_numeric(product["percentage_discount"], percent=True),
-            clean_numeric(product["dollar_discount"]),
-            clean_numeric(product["eco_fee"]),
-            clean_numeric(product["num_reviews"]),
-            clean_numeric(product["avg_rating"]),
-            parse_date(product["sale_ends"]),
-            product["upc"],
-            now,
-            existing[0]
-        ))
-    else:
-        cur.execute("""
-            INSERT INTO visions (
-                url, title, brand, model,
-                current_price, regular_price, percentage_discount, dollar_discount,
-                eco_fee, num_reviews, avg_rating,
-                main_category, sale_ends, upc, created_at
-            )
-            VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
-        """, (
-            product["url"], product["title"], product["brand"],
-            None if product["model"] == "N/A" else product["model"],
-            clean_numeric(product["current_price"]),
-            clean_numeric(product["regular_price"]),
-            clean_numeric(product["percentage_discount"], percent=True),
-            clean_numeric(product["dollar_discount"]),
-            clean_numeric(product["eco_fee"]),
-            clean_numeric(product["num_reviews"]),
-            clean_numeric(product["avg_rating"]),
-            product["main_category"],
-            parse_date(product["sale_ends"]),
-            product["upc"],
-            now
-        ))
+    with metrics.stage("db_write", "visions", category_name), get_connection() as conn, conn.cursor() as cur:
+        new, changed, unchanged = write_changed(
+            cur, "visions", ["url", "main_category"], VISIONS_COLUMNS, rows,
+            seen_column="created_at", page_size=UPSERT_BATCH_SIZE,
+        )
+        record_observations(cur, "visions", [visions_observation(row) for row in rows])
+        if progress is not None:
+            record_progress(cur, *progress)
 
-    conn.commit()
-    cur.close()
-    conn.close()
+    return new + changed + unchanged
+
+def insert_product(product):
+    upsert_products([product])
 
 # Update: Get UPC of item
 def get_upc(driver, url):
     try:
-        new_tab = driver.new_tab(url)
-        time.sleep(2)
-        upc_ele = new_tab.ele("xpath://strong[contains(text(), 'UPC')]/following-sibling::div")
+        new_tab = driver.new_tab()
+        resource_blocking.enable(new_tab, "detail")
+        new_tab.get(url)
+        upc_ele = new_tab.ele(UPC_XPATH, timeout=UPC_TIMEOUT)
         upc = upc_ele.text if upc_ele else "N/A"
         new_tab.close()
         return upc
@@ -212,13 +256,16 @@ def get_upc(driver, url):
         return "N/A"
 
 
-def get_chromium_options(browser_path: str, arguments: list) -> ChromiumOptions:
+def get_chromium_options(browser_path: str, arguments: list, port: int = 9222, user_data_dir: str = None) -> ChromiumOptions:
     """
     Configures and returns Chromium options.
+    Each concurrent browser needs its own debugging port and profile directory.
     """
     options = ChromiumOptions()
     options.set_paths(browser_path=browser_path)
-    options.set_argument("--remote-debugging-port=9222")
+    options.set_local_port(port)
+    if user_data_dir:
+        options.set_user_data_path(user_data_dir)
     for argument in arguments:
         options.set_argument(argument)
     
@@ -304,8 +351,8 @@ def extract_product_data(product, category, driver):
         sale_ends_element = product.find('div', class_='rw-grid-date')
         sale_ends = sale_ends_element.get_text(strip=True).replace('Sale Ends: ', '') if sale_ends_element else "N/A"
         
-        # UPC (opens new tab to get UPC value)
-        upc = get_upc(driver, url) if url != "N/A" else "N/A"
+        # UPC (opens new tab to get UPC value); driver=None leaves it to the UPC pool stage
+        upc = get_upc(driver, url) if driver is not None and url != "N/A" else "N/A"
         
         return {
             'url': url,
@@ -352,15 +399,14 @@ def scroll_to_load_all_products(driver):
     """
     last_height = driver.run_js("return document.body.scrollHeight")
     scroll_attempts = 0
-    max_scroll_attempts = 6
-    products_count = 0
+    max_scroll_attempts = 2  # each attempt already waits up to the site's scroll timeout
+    products_count = count_elements(driver, PRODUCT_CSS)
 
     while scroll_attempts < max_scroll_attempts:
         # Scroll down
         driver.run_js("window.scrollTo(0, document.body.scrollHeight);")
 
         # Try to click "Load More" button if present
-        clicked = False
         try:
             load_more_button = driver.ele("xpath://button[contains(., 'Load more')]", timeout=5)
             if load_more_button:
@@ -370,21 +416,24 @@ def scroll_to_load_all_products(driver):
                     
                 try:
                     load_more_button.click()
-                    clicked = True
                 except Exception as e:
                     #logging.warning(f"Normal click failed ({e}), using JS click")
                     load_more_button.click.by_js()
 
-                    # Wait for new content or spinner to disappear
-                driver.wait.ele_not_found("css:svg.amscroll-loading-icon.-amscroll-animate", timeout=10)
+                # Wait for new content or spinner to disappear
+                wait_for_spinner_gone(driver, "svg.amscroll-loading-icon.-amscroll-animate", site="visions")
 
                 scroll_attempts = 0
                 break
         except Exception as inner_e:
             logging.debug(f"Selector button failed: {inner_e}")
         
-        # Wait for new content
-        time.sleep(2 if not clicked else 4)  # fallback wait
+        # Wait for new content: product count or page height growth, whichever comes first
+        wait_until(
+            lambda: count_elements(driver, PRODUCT_CSS) > products_count
+            or driver.run_js("return document.body.scrollHeight") != last_height,
+            timeout_for("visions", "scroll"), "visions.scroll_growth",
+        )
         new_height = driver.run_js("return document.body.scrollHeight")
 
         if new_height == last_height:
@@ -396,9 +445,9 @@ def scroll_to_load_all_products(driver):
         last_height = new_height
 
         # Count products
-        current_products = driver.eles("css:li.item.product.product-item")
-        if len(current_products) > products_count:
-            products_count = len(current_products)
+        current_count = count_elements(driver, PRODUCT_CSS)
+        if current_count > products_count:
+            products_count = current_count
             logging.info(f"Currently loaded {products_count} products")
    
 def scroll_through_all_items(driver):
@@ -410,52 +459,130 @@ def scroll_through_all_items(driver):
     
     for i, product_element in enumerate(product_elements):
         try:
-            # Scroll to each product element to ensure it's loaded
-            driver.run_js('arguments[0].scrollIntoView({behavior: "smooth", block: "center"});', product_element)
-            time.sleep(0.5)  # Brief pause for content to load
+            # Scroll to each product element to trigger its lazy content
+            driver.run_js('arguments[0].scrollIntoView({behavior: "instant", block: "center"});', product_element)
                  
         except Exception as e:
             logging.debug(f"Error scrolling to product {i}: {e}")
 
-def scrape_category(driver, category_id, category_name):
+    # One wait for the lazy requests to settle instead of a pause per item
+    wait_for_network_idle(driver, site="visions")
+
+def scrape_category(driver, category_id, category_name, upc_pool=None):
     """
     Scrape all products from a specific category.
     """
     logging.info(f"Scraping category: {category_name}")
     
     # Navigate to the category URL
-    category_url = f"https://www.visions.ca/deals/clearance?cat={category_id}&visions_item_status=239699#clearancedeals"
-    driver.get(category_url)
-    time.sleep(5)  # Wait for page to load
-    
-    # Method 1: Scroll to load all content
-    scroll_to_load_all_products(driver)
-    
-    # Method 2: Scroll through each item individually
-    scroll_through_all_items(driver)
+    category_url = CATEGORY_URL.format(category_id=category_id) + "#clearancedeals"
+    with metrics.stage("page_load", "visions", category_name):
+        driver.get(category_url)
+        wait_for_selector(driver, PRODUCT_CSS, site="visions", label="product_grid")
+
+    with metrics.stage("wait_scroll", "visions", category_name):
+        # Method 1: Scroll to load all content
+        scroll_to_load_all_products(driver)
+
+        # Method 2: Scroll through each item individually
+        scroll_through_all_items(driver)
+
+    with metrics.stage("extract", "visions", category_name):
+        if EXTRACT_MODE == "js":
+            # Build compact records inside the page; Python only normalizes them
+            records_json = driver.run_js(TILE_RECORDS_JS)
+            logging.info(f"Received {len(records_json or '') // 1024} KB of product records")
+            products = list(parse_tile_records(records_json, category_name))
+        else:
+            # Use JavaScript to get ALL product elements
+            products_js = """
+            return Array.from(document.querySelectorAll('%s')).map(product => {
+                return product.outerHTML;
+            });
+            """ % PRODUCT_CSS
+
+            product_htmls = driver.run_js(products_js)
+            logging.info(f"Found {len(product_htmls)} product elements using JavaScript")
+
+            # One lxml pass over all tiles (same fields as extract_product_data)
+            products = list(parse_product_tiles(product_htmls, category_name))
+
+    # Resolve UPCs concurrently as a separate stage
+    if upc_pool is None:
+        upc_pool = UpcTabPool(driver)
+    fill_upcs(products, upc_pool, category_name)
     
-    # Use JavaScript to get ALL product elements
-    products_js = """
-    return Array.from(document.querySelectorAll('li.item.product.product-item')).map(product => {
-        return product.outerHTML;
-    });
+    logging.info(f"Successfully extracted {len(products)} products from {category_name}")
+    return products
+
+def fill_upcs(products, upc_pool, category_name=None):
+    with metrics.stage("upc", "visions", category_name):
+        upcs = upc_pool.fetch_all(p["url"] for p in products)
+    for product in products:
+        product["upc"] = upcs.get(product["url"], "N/A")
+    if products:
+        print_product_info(products[0])  # Print product for verification
+
+# Browserless replay mode
+class ClearanceRejected(Exception):
+    """Raised when Cloudflare refuses a request made with the browser's clearance cookies."""
+
+def build_http_session(driver):
     """
-    
-    product_htmls = driver.run_js(products_js)
-    logging.info(f"Found {len(product_htmls)} product elements using JavaScript")
-    
+    Copy the browser's cookies (including cf_clearance) and user-agent into a
+    requests session, so category listings can be fetched without rendering.
+    """
+    session = requests.Session()
+    session.headers.update({
+        "User-Agent": driver.user_agent,
+        "Accept-Language": "en-US,en;q=0.9",
+        "Referer": os.getenv("VISIONSITE") or "https://www.visions.ca/",
+    })
+    for cookie in driver.cookies(all_domains=True):
+        session.cookies.set(
+            cookie["name"], cookie["value"],
+            domain=cookie.get("domain"), path=cookie.get("path", "/"),
+        )
+    return session
+
+def listing_html(resp):
+    """Return the product HTML from a listing page or an infinite-scroll ajax response."""
+    if "json" in resp.headers.get("Content-Type", ""):
+        data = resp.json()
+        return data.get("categoryProducts") or data.get("products") or ""
+    return resp.text
+
+def scrape_category_http(session, category_id, category_name, upc_pool):
+    """
+    Scrape a category by requesting its paginated listing directly.
+    Stops at the first page that adds no new product URLs.
+    """
+    logging.info(f"Scraping category over HTTP: {category_name}")
     products = []
-    for i, product_html in enumerate(product_htmls):
-        try:
-            soup = BeautifulSoup(product_html, 'html.parser')
-            product_data = extract_product_data(soup, category_name, driver)
-            if product_data:
-                products.append(product_data)
-                if i < 1:  # Print product for verification
-                    print_product_info(product_data)
-        except Exception as e:
-            logging.error(f"Error processing product {i}: {e}")
-    
+    seen = set()
+    for page in range(1, HTTP_MAX_PAGES + 1):
+        with metrics.stage("page_load", "visions", category_name):
+            resp = session.get(
+                CATEGORY_URL.format(category_id=category_id),
+                params={"p": page},
+                timeout=HTTP_TIMEOUT,
+            )
+        if resp.status_code in (403, 503):
+            raise ClearanceRejected(f"HTTP {resp.status_code} for {resp.url}")
+        resp.raise_for_status()
+
+        added = 0
+        with metrics.stage("extract", "visions", category_name):
+            for product_data in parse_product_grid(listing_html(resp), category_name):
+                if product_data["url"] not in seen:
+                    seen.add(product_data["url"])
+                    products.append(product_data)
+                    added += 1
+        logging.info(f"Page {page}: {added} new products ({len(resp.content) // 1024} KB)")
+        if not added:
+            break
+
+    fill_upcs(products, upc_pool, category_name)
     logging.info(f"Successfully extracted {len(products)} products from {category_name}")
     return products
 
@@ -483,125 +610,314 @@ def choose_categories(categories):
     print(f"Selected categories: {[categories[i] for i in selected_ids]}")
     return {cat_id: categories[cat_id] for cat_id in selected_ids}
 
-def main():
-    isHeadless = os.getenv('HEADLESS', 'false').lower() == 'true'
-    
-    categories = {
-        36: "Television",
-        40: "Home Audio", 
-        16: "Laptops",
-        6: "Personal Audio",
-        15: "Cameras and Drones",
-        17: "Smart Lighting",
-        488: "A/C and Cooling",
-        5: "Car Tech",
-        13: "Wearables",
-        46: "Cell Accessories",
-        18: "Major Appliances",
-        19: "Small Appliances"
-    }
-
-    # --- Check for existing checkpoint ---
-    checkpoint = None
-    if os.path.exists(CHECKPOINT_FILE):
-        with open(CHECKPOINT_FILE, "r") as f:
-            checkpoint = json.load(f)
-        choice = input("Found an interrupted scraping. Continue (C) or start new (N)? ").strip().lower()
-        if choice.startswith("c"):
-            logging.info("Resuming from checkpoint...")
-        else:
-            logging.info("Starting new scrape, overwriting checkpoint.")
-            checkpoint = None
-
-    if checkpoint is None:
-        # Ask user which categories to scrape fresh
-        categories_to_scrape = choose_categories(categories)
-        checkpoint = {
-            "mode": "resume",
-            "categories": [{"id": cid, "name": cname} for cid, cname in categories_to_scrape.items()],
-            "current_category_index": 0,
-            "current_product_index": 0
-        }
-        save_checkpoint(checkpoint)
-
-    if isHeadless:
-        from pyvirtualdisplay import Display
-        display = Display(visible=0, size=(1366, 768))
-        display.start()
-
+# Browser / worker settings
+CHROMIUM_ARGUMENTS = [
+    "--no-sandbox",
+    "--disable-dev-shm-usage",
+    "--disable-gpu",
+    "--no-first-run",
+    "--force-color-profile=srgb",
+    "--metrics-recording-only",
+    "--password-store=basic",
+    "--use-mock-keychain",
+    "--export-tagged-pdf",
+    "--no-default-browser-check",
+    "--disable-background-mode",
+    "--deny-permission-prompts",
+    "--accept-lang=en-US",
+    "--window-size=1366,768",
+]
+VISIONS_WORKERS = int(os.getenv("VISIONS_WORKERS", 1))
+BASE_DEBUG_PORT = int(os.getenv("CHROME_DEBUG_PORT", 9222))
+PROFILE_ROOT = os.getenv("CHROME_PROFILE_ROOT", "/tmp/visions-profiles")
+
+def launch_browser(worker_id=0):
+    """Start a Chromium instance with its own debugging port (and profile when parallel)."""
     browser_path = os.getenv('CHROME_PATH', "/usr/bin/chromium")
-    arguments = [
-        "--no-sandbox",
-        "--disable-dev-shm-usage",
-        "--disable-gpu",
-        "--no-first-run",
-        "--force-color-profile=srgb",
-        "--metrics-recording-only",
-        "--password-store=basic",
-        "--use-mock-keychain",
-        "--export-tagged-pdf",
-        "--no-default-browser-check",
-        "--disable-background-mode",
-        "--deny-permission-prompts",
-        "--accept-lang=en-US",
-        "--window-size=1366,768",
-    ]
-    if isHeadless:
+    arguments = list(CHROMIUM_ARGUMENTS)
+    if os.getenv('HEADLESS', 'false').lower() == 'true':
         arguments.append("--headless=new")
 
-    options = get_chromium_options(browser_path, arguments)
+    user_data_dir = os.path.join(PROFILE_ROOT, f"worker{worker_id}") if VISIONS_WORKERS > 1 else None
+    options = get_chromium_options(browser_path, arguments, BASE_DEBUG_PORT + worker_id, user_data_dir)
     driver = ChromiumPage(addr_or_opts=options)
+    resource_blocking.enable(driver, "listing")
+    return driver
 
+def category_sizes():
+    """Product counts per category from the last run, used to schedule largest-first."""
+    try:
+        with get_connection() as conn, conn.cursor() as cur:
+            cur.execute("SELECT main_category, COUNT(*) FROM visions GROUP BY main_category")
+            return dict(cur.fetchall())
+    except Exception as e:
+        logging.warning(f"Could not read category sizes: {e}")
+        return {}
+
+def extract_category(driver, ctx, category_id, category_name):
+    """Product dicts (with UPCs) for one category, over HTTP when enabled, else in the browser."""
+    if ctx["http_session"] is not None:
+        try:
+            return scrape_category_http(ctx["http_session"], category_id, category_name, ctx["http_upc_pool"])
+        except ClearanceRejected as e:
+            logging.warning(f"HTTP mode rejected for {category_name} ({e}), falling back to browser")
+            ctx["clearance_store"].invalidate(urlparse(CATEGORY_URL).netloc)
+            ctx["clearance_store"].invalidate(urlparse(os.getenv("VISIONSITE")).netloc)
+        except requests.RequestException as e:
+            logging.warning(f"HTTP mode failed for {category_name} ({e}), falling back to browser")
+    return scrape_category(driver, category_id, category_name, ctx["upc_pool"])
+
+def scrape_and_store(driver, ctx, category, start_index, report):
+    """Scrape one category and write it in batches, reporting progress after each commit."""
+    category_id, category_name = category["id"], category["name"]
+    # Queued categories carry their own run and may resume on another host,
+    # so their extracted list is kept in Postgres instead of checkpoint_items/
+    shared = "run_id" in category
+    run_id = category["run_id"] if shared else ctx["run_id"]
+
+    # Resume from the list extracted before the interruption, if it was saved
+    products = (load_shared_items if shared else load_items)(run_id, category_id)
+    if products is not None:
+        logging.info(f"Resuming {category_name} at product {start_index} of {len(products)} from the saved list")
+    else:
+        if start_index:
+            # a position only means something in the list it was counted in
+            logging.warning(f"No saved list for {category_name}; restarting it from the first product")
+            start_index = 0
+        logging.info(f"Scraping category: {category_name}")
+        products = extract_category(driver, ctx, category_id, category_name)
+        (save_shared_items if shared else save_items)(run_id, category_id, products)
+
+    batch = []
+    for prod_idx in range(start_index, len(products)):
+        batch.append(products[prod_idx])
+
+        # flush when the batch is full or the category ends
+        last = prod_idx == len(products) - 1
+        if len(batch) >= UPSERT_BATCH_SIZE or last:
+            upsert_products(batch, progress=(run_id, category_id, prod_idx + 1, last))
+            metrics.count("items", "visions", category_name, len(batch))
+            batch = []
+
+            # checkpoint only advances past rows that are committed
+            report(("progress", category_id, prod_idx + 1))
+
+    if start_index >= len(products):
+        mark_done(run_id, category_id)  # nothing left to write
+
+    # after finishing a category, mark it done
+    report(("done", category_id))
+    (drop_shared_items if shared else drop_items)(run_id, category_id)
+
+def run_worker(worker_id, run_id, next_category, report):
+    """
+    Drive one browser: pass Cloudflare, then scrape categories handed out by
+    next_category() until it returns None.
+    """
+    ensure_progress_schema()  # scrape_progress is written with every batch
+    driver = launch_browser(worker_id)
+    upc_cache = None
     try:
-        logging.info('Starting Visions.ca scraper')
-        driver.get(os.getenv("VISIONSITE"))
-        time.sleep(3)
+        logging.info(f'Starting Visions.ca scraper (worker {worker_id})')
+        clearance_store = ClearanceStore()
 
-        # Try Cloudflare bypass
+        # Reuse stored Cloudflare clearance, bypass only when it's missing or rejected
         try:
-            cf_bypasser = CloudflareBypasser(driver)
-            cf_bypasser.bypass()
-            logging.info("Cloudflare bypass completed!")
+            with metrics.stage("cloudflare", "visions"):
+                passed = ensure_clearance(driver, os.getenv("VISIONSITE"), clearance_store)
+            if passed:
+                logging.info("Cloudflare bypass completed!")
+            else:
+                logging.warning("Cloudflare bypass failed")
         except Exception as e:
             logging.warning(f"Cloudflare bypass failed: {e}")
 
-        # Resume from checkpoint
-        start_cat_idx = checkpoint["current_category_index"]
-        for cat_idx in range(start_cat_idx, len(checkpoint["categories"])):
-            category = checkpoint["categories"][cat_idx]
-            category_id, category_name = category["id"], category["name"]
-            logging.info(f"Scraping category: {category_name}")
-
-            products = scrape_category(driver, category_id, category_name)
+        upc_cache = UpcCache()
+        if os.getenv("UPC_CACHE_WARM", "false").lower() == "true" and worker_id == 0:
+            upc_cache.warm_from_db()
+        ctx = {
+            "run_id": run_id,
+            "clearance_store": clearance_store,
+            "upc_pool": UpcTabPool(driver, cache=upc_cache),
+            "http_session": None,
+            "http_upc_pool": None,
+        }
+        if VISIONS_MODE == "http":
+            ctx["http_session"] = build_http_session(driver)
+            ctx["http_upc_pool"] = UpcHttpPool(ctx["http_session"], cache=upc_cache)
 
-            start_prod_idx = checkpoint["current_product_index"] if cat_idx == start_cat_idx else 0
-            for prod_idx in range(start_prod_idx, len(products)):
-                product = products[prod_idx]
-                insert_product(product)
+        while True:
+            task = next_category()
+            if task is None:
+                break
+            category, start_index = task
+            scrape_and_store(driver, ctx, category, start_index, report)
+
+        ctx["upc_pool"].log_stats()
+        if ctx["http_upc_pool"] is not None:
+            ctx["http_upc_pool"].log_stats()
+        log_wait_stats()
+        log_clearance_stats()
+        log_change_stats()
+        resource_blocking.log_stats()
+    finally:
+        if upc_cache is not None:
+            upc_cache.close()
+        driver.quit()
 
-                # update checkpoint after each product
-                checkpoint["current_category_index"] = cat_idx
-                checkpoint["current_product_index"] = prod_idx + 1
-                save_checkpoint(checkpoint)
+def _worker_process(worker_id, run_id, tasks, reports):
+    try:
+        run_worker(worker_id, run_id, tasks.get, reports.put)
+    except Exception as e:
+        logging.error("Worker %d stopped: %s", worker_id, str(e))
+    finally:
+        log_stats()
+        close_pool()
+        reports.put(("metrics", metrics.snapshot()))
+        reports.put(("exit", worker_id))
+
+def run_parallel(checkpoint, journal, pending, workers):
+    """Run `workers` browser processes pulling from one category queue; the parent owns the checkpoint."""
+    mp = multiprocessing.get_context("spawn")
+    tasks, reports = mp.Queue(), mp.Queue()
+    for task in pending:
+        tasks.put(task)
+    for _ in range(workers):
+        tasks.put(None)
+
+    processes = [mp.Process(target=_worker_process, args=(i, checkpoint["run_id"], tasks, reports)) for i in range(workers)]
+    for process in processes:
+        process.start()
+
+    running = workers
+    while running:
+        try:
+            message = reports.get(timeout=5)
+        except queue.Empty:
+            if not any(p.is_alive() for p in processes):
+                break  # a worker died without reporting
+            continue
+        if message[0] == "exit":
+            running -= 1
+        elif message[0] == "metrics":
+            metrics.merge(message[1])
+        else:
+            apply_report(checkpoint, message, journal)
+
+    for process in processes:
+        process.join()
+
+VISIONS_CATEGORIES = {
+    36: "Television",
+    40: "Home Audio",
+    16: "Laptops",
+    6: "Personal Audio",
+    15: "Cameras and Drones",
+    17: "Smart Lighting",
+    488: "A/C and Cooling",
+    5: "Car Tech",
+    13: "Wearables",
+    46: "Cell Accessories",
+    18: "Major Appliances",
+    19: "Small Appliances"
+}
+
+def visions_checkpoint(category_ids=None, resume=True):
+    """Checkpoint to run without prompting: the interrupted one when resume is set, else a new one."""
+    checkpoint = load_checkpoint() if resume else None
+    if checkpoint is not None:
+        logging.info("Resuming from checkpoint...")
+        return checkpoint
+    ids = category_ids or list(VISIONS_CATEGORIES)
+    return new_checkpoint({cid: VISIONS_CATEGORIES[cid] for cid in ids})
+
+def run_visions(checkpoint, workers=VISIONS_WORKERS):
+    """
+    Scrape every unfinished category of `checkpoint`.
+    Returns {"categories", "products", "complete"}; the caller owns the DB pool.
+    """
+    isHeadless = os.getenv('HEADLESS', 'false').lower() == 'true'
+    merge_committed_progress(checkpoint)
 
-            # after finishing a category, move to next
-            checkpoint["current_category_index"] = cat_idx + 1
-            checkpoint["current_product_index"] = 0
-            save_checkpoint(checkpoint)
+    # Start the journal from a snapshot of the current state
+    journal = CheckpointJournal(CHECKPOINT_JOURNAL)
+    journal.compact(checkpoint)
+    if os.path.exists(CHECKPOINT_FILE):
+        os.remove(CHECKPOINT_FILE)
+
+    # Resume from checkpoint: every category not yet done, from its last committed product
+    progress = category_progress(checkpoint)
+    written_before = sum(entry["product_index"] for entry in progress.values())
+    pending = [
+        (c, progress.get(str(c["id"]), {}).get("product_index", 0))
+        for c in checkpoint["categories"]
+        if not progress.get(str(c["id"]), {}).get("done")
+    ]
+    workers = max(1, min(workers, len(pending)))
+    if workers > 1:
+        sizes = category_sizes()
+        pending.sort(key=lambda task: sizes.get(task[0]["name"], 0), reverse=True)
 
-        logging.info("Scraping completed for all categories.")
-        # --- Auto-delete checkpoint after success ---
-        if os.path.exists(CHECKPOINT_FILE):
-            os.remove(CHECKPOINT_FILE)
-            logging.info("Checkpoint file deleted (scraping finished successfully).")
+    if isHeadless:
+        from pyvirtualdisplay import Display
+        display = Display(visible=0, size=(1366, 768))
+        display.start()
 
-    except Exception as e:
-        logging.error("An error occurred: %s", str(e))
+    try:
+        if workers > 1:
+            logging.info(f"Scraping {len(pending)} categories with {workers} browsers")
+            run_parallel(checkpoint, journal, pending, workers)
+        else:
+            tasks = iter(pending)
+            run_worker(0, checkpoint["run_id"], lambda: next(tasks, None),
+                       lambda message: apply_report(checkpoint, message, journal))
+
+        complete = all(entry["done"] for entry in category_progress(checkpoint).values())
+        if complete:
+            logging.info("Scraping completed for all categories.")
+            # --- Auto-delete checkpoint after success ---
+            journal.remove()
+            clear_progress(checkpoint["run_id"])
+            clear_items(checkpoint["run_id"])
+            logging.info("Checkpoint journal deleted (scraping finished successfully).")
+        else:
+            logging.warning("Some categories did not finish; run again to resume from the checkpoint.")
     finally:
-        driver.quit()
+        journal.close()
         if isHeadless:
             display.stop()
 
+    return {
+        "categories": len(pending),
+        "products": sum(entry["product_index"] for entry in category_progress(checkpoint).values()) - written_before,
+        "complete": complete,
+    }
+
+def main():
+    metrics.start()
+
+    # --- Check for existing checkpoint ---
+    checkpoint = load_checkpoint()
+    if checkpoint is not None:
+        choice = input("Found an interrupted scraping. Continue (C) or start new (N)? ").strip().lower()
+        if choice.startswith("c"):
+            logging.info("Resuming from checkpoint...")
+        else:
+            logging.info("Starting new scrape, overwriting checkpoint.")
+            checkpoint = None
+
+    if checkpoint is None:
+        # Ask user which categories to scrape fresh
+        categories_to_scrape = choose_categories(VISIONS_CATEGORIES)
+        checkpoint = new_checkpoint(categories_to_scrape)
+
+    try:
+        run_visions(checkpoint)
+    except Exception as e:
+        logging.error("An error occurred: %s", str(e))
+    finally:
+        log_stats()
+        close_pool()
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
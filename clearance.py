@@ -0,0 +1,135 @@
+import os
+import json
+import time
+import fcntl
+import logging
+import threading
+from contextlib import contextmanager
+from urllib.parse import urlparse
+from CloudflareBypasser import CloudflareBypasser
+from waits import wait_for_dom_ready
+
+# Clearance store
+CLEARANCE_PATH = os.getenv("CF_CLEARANCE_PATH", "cf_clearance.json")
+CLEARANCE_TTL = float(os.getenv("CF_CLEARANCE_TTL_MINUTES", 30)) * 60  # used when the cookie has no expiry
+CF_MAX_RETRIES = int(os.getenv("CF_MAX_RETRIES", 15))
+
+_lock = threading.Lock()
+
+stats = {"hits": 0, "misses": 0, "rejected": 0, "bypass_seconds": 0.0}
+
+
+class ClearanceStore:
+    """
+    Cloudflare clearance (cookies + user-agent + expiry) per domain, kept in a
+    JSON file so later runs and parallel workers can reuse it.
+    Writes go through a temp file + os.replace, so readers never see a partial file;
+    updates hold an flock on a sidecar lock file, so worker processes don't
+    overwrite each other's entries.
+    """
+
+    def __init__(self, path=CLEARANCE_PATH):
+        self.path = path
+
+    def _read(self):
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _write(self, data):
+        tmp = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp, self.path)
+
+    @contextmanager
+    def _locked(self):
+        """Serialize read-modify-write across threads (_lock) and processes (flock)."""
+        with _lock, open(f"{self.path}.lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def load(self, domain):
+        """Return the stored clearance for domain, or None if missing or expired."""
+        entry = self._read().get(domain)
+        if not entry or entry.get("expires", 0) <= time.time():
+            return None
+        return entry
+
+    def save(self, domain, cookies, user_agent):
+        now = time.time()
+        expires = now + CLEARANCE_TTL
+        for cookie in cookies:
+            if cookie.get("name") == "cf_clearance" and cookie.get("expires"):
+                expires = min(expires, float(cookie["expires"]))
+        with self._locked():
+            data = self._read()
+            data[domain] = {
+                "cookies": cookies,
+                "user_agent": user_agent,
+                "expires": expires,
+                "saved_at": now,
+            }
+            self._write(data)
+
+    def invalidate(self, domain):
+        with self._locked():
+            data = self._read()
+            if data.pop(domain, None) is not None:
+                self._write(data)
+
+
+def ensure_clearance(driver, url, store=None):
+    """
+    Open url with Cloudflare clearance. Reuses stored clearance when it is still
+    accepted and only solves a new challenge when it is missing or rejected.
+    Returns True when the page is past the challenge.
+    """
+    store = store or ClearanceStore()
+    domain = urlparse(url).netloc
+    bypasser = CloudflareBypasser(driver, max_retries=CF_MAX_RETRIES)
+
+    entry = store.load(domain)
+    if entry:
+        try:
+            driver.set.user_agent(entry["user_agent"])
+            driver.set.cookies(entry["cookies"])
+        except Exception as e:
+            logging.debug(f"Could not apply stored clearance: {e}")
+
+    driver.get(url)
+    wait_for_dom_ready(driver, site="visions")
+
+    if entry:
+        if bypasser.is_bypassed():
+            stats["hits"] += 1
+            logging.info(f"Reused stored Cloudflare clearance for {domain}")
+            return True
+        stats["rejected"] += 1
+        logging.info(f"Stored Cloudflare clearance for {domain} was rejected")
+        store.invalidate(domain)
+    else:
+        stats["misses"] += 1
+
+    started = time.monotonic()
+    try:
+        bypasser.bypass()
+    finally:
+        stats["bypass_seconds"] += time.monotonic() - started
+
+    if not bypasser.is_bypassed():
+        return False
+    store.save(domain, list(driver.cookies(all_domains=True)), driver.user_agent)
+    return True
+
+
+def log_stats():
+    logging.info(
+        f"Cloudflare clearance: {stats['hits']} reused, {stats['misses']} missing, "
+        f"{stats['rejected']} rejected, {stats['bypass_seconds']:.1f}s solving challenges"
+    )
@@ -0,0 +1,5 @@
+# Lets tests/ import the top-level scraper modules.
+from browser_stub import stub_browser_driver
+
+# The parsers under test never drive a browser; stand in for DrissionPage when it isn't installed
+stub_browser_driver()
@@ -0,0 +1,128 @@
+import os
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from dotenv import load_dotenv
+from psycopg2.pool import ThreadedConnectionPool
+
+load_dotenv()
+
+# Pool bounds (shared by every scraper in the process)
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", 1))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", 5))
+
+_pool = None
+_slots = None
+_pool_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_seen_connections = set()
+
+stats = {
+    "connections_opened": 0,  # physical connections created by the pool
+    "checkouts": 0,           # total get_connection() calls
+    "reuses": 0,              # checkouts served by an already-open connection
+    "waits": 0,               # checkouts that had to wait for a free slot
+    "wait_seconds": 0.0,      # total time spent waiting for a slot
+}
+
+
+def connect_kwargs() -> dict:
+    """Build psycopg2 connect arguments from DATABASE_URL or the DB_* variables."""
+    database_url = os.getenv("DATABASE_URL")
+    if database_url:
+        return {"dsn": database_url}
+    return {
+        "host": os.getenv("DB_HOST"),
+        "port": os.getenv("DB_PORT", 5432),
+        "dbname": os.getenv("DB_NAME"),
+        "user": os.getenv("DB_USER"),
+        "password": os.getenv("DB_PASS"),
+    }
+
+
+def get_pool() -> ThreadedConnectionPool:
+    """Create the shared pool on first use and return it."""
+    global _pool, _slots
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _slots = threading.BoundedSemaphore(DB_POOL_MAX)
+                _pool = ThreadedConnectionPool(DB_POOL_MIN, DB_POOL_MAX, **connect_kwargs())
+                logging.info(f"Postgres pool ready (min={DB_POOL_MIN}, max={DB_POOL_MAX})")
+    return _pool
+
+
+def _count(key, amount=1):
+    with _stats_lock:
+        stats[key] += amount
+
+
+@contextmanager
+def get_connection():
+    """
+    Borrow a pooled connection. Commits on success, rolls back on error,
+    and always returns the connection to the pool.
+    Blocks (instead of raising PoolError) when all DB_POOL_MAX connections are in use.
+    """
+    pool = get_pool()
+    if not _slots.acquire(blocking=False):
+        started = time.monotonic()
+        _slots.acquire()
+        _count("waits")
+        _count("wait_seconds", time.monotonic() - started)
+
+    conn = None
+    broken = False
+    try:
+        conn = pool.getconn()
+        with _stats_lock:
+            stats["checkouts"] += 1
+            if id(conn) in _seen_connections:
+                stats["reuses"] += 1
+            else:
+                _seen_connections.add(id(conn))
+                stats["connections_opened"] += 1
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            try:
+                conn.rollback()
+            except Exception:
+                broken = True
+            raise
+    finally:
+        if conn is not None:
+            broken = broken or bool(conn.closed)
+            if broken:
+                with _stats_lock:
+                    _seen_connections.discard(id(conn))
+            pool.putconn(conn, close=broken)
+        _slots.release()
+
+
+def get_stats() -> dict:
+    """Return a snapshot of the pool counters."""
+    with _stats_lock:
+        return dict(stats)
+
+
+def log_stats():
+    s = get_stats()
+    logging.info(
+        f"DB pool: {s['checkouts']} checkouts, {s['connections_opened']} connections opened, "
+        f"{s['reuses']} reused, {s['waits']} waits ({s['wait_seconds']:.2f}s)"
+    )
+
+
+def close_pool():
+    """Close every pooled connection (call once at process exit)."""
+    global _pool, _slots
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+            _slots = None
+            with _stats_lock:
+                _seen_connections.clear()
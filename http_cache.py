@@ -0,0 +1,134 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+
+# Conditional-request cache for listing pages
+HTTP_CACHE_PATH = os.getenv("HTTP_CACHE_PATH", "http_cache.sqlite3")
+
+
+class CachedResponse:
+    """Result of HttpCache.get: the body (None when not re-sent) and whether it matches the last run."""
+
+    def __init__(self, url, text, unchanged, items, etag, last_modified, digest, size, urls=None):
+        self.url = url
+        self.text = text
+        self.unchanged = unchanged
+        self.items = items  # item count recorded for the unchanged body (None if changed)
+        self.etag = etag
+        self.last_modified = last_modified
+        self.digest = digest
+        self.size = size
+        self.urls = urls  # product URLs recorded for the unchanged body (None if changed)
+
+
+class HttpCache:
+    """
+    On-disk URL -> (ETag, Last-Modified, body digest, item count, product URLs) map.
+    Sends If-None-Match / If-Modified-Since, and reports a page as unchanged on a
+    304 or when the new body hashes to the stored digest. Entries are only
+    written through commit(), after the caller has processed the page, so a
+    failed write is retried on the next run.
+    """
+
+    def __init__(self, path=HTTP_CACHE_PATH):
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS http_cache (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                digest TEXT NOT NULL,
+                items INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                fetched_at REAL NOT NULL,
+                urls TEXT  -- JSON list of the page's product URLs
+            )
+        """)
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(http_cache)")}
+        if "urls" not in columns:  # caches written before product URLs were stored
+            self.conn.execute("ALTER TABLE http_cache ADD COLUMN urls TEXT")
+        self.conn.commit()
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "not_modified": 0, "digest_hits": 0, "misses": 0,
+                      "bytes_received": 0, "bytes_saved": 0}  # bytes_saved: bodies not re-sent thanks to 304
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self.stats[key] += amount
+
+    def _lookup(self, url):
+        """Cached entry, or None; entries without product URLs are treated as missing so they get refreshed."""
+        with self._lock:
+            entry = self.conn.execute(
+                "SELECT etag, last_modified, digest, items, size, urls FROM http_cache WHERE url = ?", (url,)
+            ).fetchone()
+        if entry is None or entry[5] is None:
+            return None
+        return entry[:5] + (json.loads(entry[5]),)
+
+    def get(self, session, url, timeout=None):
+        entry = self._lookup(url)
+        headers = {}
+        if entry:
+            etag, last_modified = entry[0], entry[1]
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+
+        resp = session.get(url, headers=headers, timeout=timeout)
+        self._count("requests")
+        if resp.status_code == 304 and entry:
+            self._count("not_modified")
+            self._count("bytes_saved", entry[4])
+            return CachedResponse(url, None, True, entry[3], entry[0], entry[1], entry[2], entry[4], entry[5])
+        resp.raise_for_status()
+
+        body = resp.content
+        self._count("bytes_received", len(body))
+        digest = hashlib.sha256(body).hexdigest()
+        etag = resp.headers.get("ETag")
+        last_modified = resp.headers.get("Last-Modified")
+        if entry and entry[2] == digest:
+            self._count("digest_hits")
+            return CachedResponse(url, resp.text, True, entry[3], etag, last_modified, digest, len(body), entry[5])
+        self._count("misses")
+        return CachedResponse(url, resp.text, False, None, etag, last_modified, digest, len(body))
+
+    def commit(self, response, urls):
+        """Remember a page, with the product URLs it listed, once it has been processed."""
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO http_cache (url, etag, last_modified, digest, items, size, fetched_at, urls) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (response.url, response.etag, response.last_modified, response.digest, len(urls),
+                 response.size, time.time(), json.dumps(urls)),
+            )
+            self.conn.commit()
+
+    def ratios(self):
+        with self._lock:
+            total = self.stats["requests"] or 1
+            return {
+                "not_modified": self.stats["not_modified"] / total,
+                "digest_hits": self.stats["digest_hits"] / total,
+                "misses": self.stats["misses"] / total,
+            }
+
+    def log_stats(self):
+        r = self.ratios()
+        with self._lock:
+            s = dict(self.stats)
+        logging.info(
+            f"HTTP cache: {s['requests']} requests, {r['not_modified']:.0%} 304, "
+            f"{r['digest_hits']:.0%} unchanged body, {r['misses']:.0%} changed/new, "
+            f"{s['bytes_received'] / 1024:.0f} KB received, {s['bytes_saved'] / 1024:.0f} KB not re-sent"
+        )
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
@@ -0,0 +1,183 @@
+import os
+import json
+import time
+import atexit
+import bisect
+import logging
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Per-stage run metrics shared by every scraper.
+#
+# Stages (page_load, cloudflare, wait_scroll, extract, upc, normalize,
+# db_write, checkpoint) are timed into histograms labelled by retailer and
+# category; counters track items and errors. Recording is a perf_counter call
+# plus a locked dict update, cheap enough to leave on.
+#
+# METRICS_PORT=9108 serves Prometheus text on http://127.0.0.1:9108/metrics;
+# METRICS_REPORT=path writes the JSON run report at exit.
+
+METRICS_PORT = int(os.getenv("METRICS_PORT", 0))  # 0 disables the endpoint
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_REPORT = os.getenv("METRICS_REPORT", "")  # empty disables the report
+BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+_lock = threading.Lock()
+_histograms = {}  # (stage, retailer, category) -> {"buckets": [...], "sum", "count"}
+_counters = {}    # (name, retailer, category) -> value
+_started = time.time()
+_server = None
+
+
+def _category(category):
+    return "" if category is None else str(category)
+
+
+def observe(stage, seconds, retailer, category=None):
+    key = (stage, retailer, _category(category))
+    index = bisect.bisect_left(BUCKETS, seconds)
+    with _lock:
+        h = _histograms.get(key)
+        if h is None:
+            h = _histograms[key] = {"buckets": [0] * (len(BUCKETS) + 1), "sum": 0.0, "count": 0}
+        h["buckets"][index] += 1
+        h["sum"] += seconds
+        h["count"] += 1
+
+
+def count(name, retailer, category=None, amount=1):
+    key = (name, retailer, _category(category))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+@contextmanager
+def stage(name, retailer, category=None):
+    """Time the body as one observation of `name`; counts a stage error if it raises."""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        count(f"{name}_errors", retailer, category)
+        raise
+    finally:
+        observe(name, time.perf_counter() - started, retailer, category)
+
+
+# Worker processes send their metrics to the parent
+
+def snapshot():
+    with _lock:
+        return {
+            "histograms": [[list(k), {"buckets": list(v["buckets"]), "sum": v["sum"], "count": v["count"]}]
+                           for k, v in _histograms.items()],
+            "counters": [[list(k), v] for k, v in _counters.items()],
+        }
+
+
+def merge(data):
+    with _lock:
+        for key, h in data["histograms"]:
+            key = tuple(key)
+            mine = _histograms.setdefault(key, {"buckets": [0] * (len(BUCKETS) + 1), "sum": 0.0, "count": 0})
+            mine["buckets"] = [a + b for a, b in zip(mine["buckets"], h["buckets"])]
+            mine["sum"] += h["sum"]
+            mine["count"] += h["count"]
+        for key, value in data["counters"]:
+            key = tuple(key)
+            _counters[key] = _counters.get(key, 0) + value
+
+
+# Output
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(retailer, category, **extra):
+    labels = {"retailer": retailer, "category": category, **extra}
+    return ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+
+
+def prometheus_text():
+    lines = [
+        "# HELP scraper_stage_seconds Time spent per scrape stage.",
+        "# TYPE scraper_stage_seconds histogram",
+    ]
+    with _lock:
+        histograms = sorted(_histograms.items())
+        counters = sorted(_counters.items())
+    for (stage_name, retailer, category), h in histograms:
+        cumulative = 0
+        for bound, n in zip(list(BUCKETS) + ["+Inf"], h["buckets"]):
+            cumulative += n
+            lines.append(f"scraper_stage_seconds_bucket{{{_labels(retailer, category, stage=stage_name, le=bound)}}} {cumulative}")
+        lines.append(f"scraper_stage_seconds_sum{{{_labels(retailer, category, stage=stage_name)}}} {h['sum']:.6f}")
+        lines.append(f"scraper_stage_seconds_count{{{_labels(retailer, category, stage=stage_name)}}} {h['count']}")
+    lines.append("# HELP scraper_events_total Items and errors counted during the run.")
+    lines.append("# TYPE scraper_events_total counter")
+    for (name, retailer, category), value in counters:
+        lines.append(f"scraper_events_total{{{_labels(retailer, category, event=name)}}} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def report():
+    """JSON-friendly summary: per retailer/stage totals, then per category detail."""
+    with _lock:
+        histograms = sorted(_histograms.items())
+        counters = sorted(_counters.items())
+    out = {"started_at": _started, "finished_at": time.time(), "retailers": {}}
+    for (stage_name, retailer, category), h in histograms:
+        r = out["retailers"].setdefault(retailer, {"stages": {}, "categories": {}, "counters": {}})
+        total = r["stages"].setdefault(stage_name, {"count": 0, "seconds": 0.0})
+        total["count"] += h["count"]
+        total["seconds"] = round(total["seconds"] + h["sum"], 3)
+        if category:
+            detail = r["categories"].setdefault(category, {})
+            detail[stage_name] = {"count": h["count"], "seconds": round(h["sum"], 3)}
+    for (name, retailer, category), value in counters:
+        r = out["retailers"].setdefault(retailer, {"stages": {}, "categories": {}, "counters": {}})
+        r["counters"][name] = r["counters"].get(name, 0) + value
+    return out
+
+
+def write_report(path=None):
+    path = path or METRICS_REPORT
+    if not path:
+        return
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report(), f, indent=2)
+    logging.info(f"Metrics report written to {path}")
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = prometheus_text().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start(port=METRICS_PORT, report_path=METRICS_REPORT):
+    """Serve /metrics on `port` (if set) and write the JSON report at exit (if set). Safe to call twice."""
+    global _server
+    if report_path:
+        atexit.unregister(write_report)
+        atexit.register(write_report, report_path)
+    if port and _server is None:
+        try:
+            _server = ThreadingHTTPServer((METRICS_HOST, port), _Handler)
+        except OSError as e:
+            logging.warning(f"Metrics endpoint not started on port {port}: {e}")
+            return
+        threading.Thread(target=_server.serve_forever, name="metrics", daemon=True).start()
+        logging.info(f"Serving metrics on http://{METRICS_HOST}:{port}/metrics")
@@ -0,0 +1,223 @@
+import os
+import sys
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+from psycopg2.extras import execute_values
+from db import get_connection, close_pool
+
+# Append-only price history shared by every retailer.
+#
+# price_observations is range-partitioned by month on observed_at, so a
+# "last 90 days" query only touches three or four partitions. BRIN keeps the
+# time index tiny (rows arrive in observed_at order); the (retailer, url,
+# observed_at) btree serves per-product history lookups.
+#
+# latest_prices is the "latest price per product" view. Postgres can only
+# refresh a MATERIALIZED VIEW in full, so it is a plain table that
+# refresh_latest() brings up to date from the observations added since the
+# last refresh (see latest_prices_watermark).
+#
+# Writers create the tables and partitions on first use; `python price_history.py
+# init` creates them (and the next months' partitions) ahead of time.
+
+REFRESH_OVERLAP = timedelta(minutes=int(os.getenv("PRICE_REFRESH_OVERLAP_MINUTES", 60)))  # re-scan window for late commits
+PAGE_SIZE = 500
+
+OBSERVATION_COLUMNS = ["url", "observed_at", "price", "regular_price", "title", "upc", "in_stock"]
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS price_observations (
+        retailer TEXT NOT NULL,               -- visions / shoppersdrugmart / canadacomputers
+        url VARCHAR(2000) NOT NULL,
+        observed_at TIMESTAMPTZ NOT NULL,
+        price NUMERIC(10,2),
+        regular_price NUMERIC(10,2),
+        title VARCHAR(255),
+        upc VARCHAR(50),
+        in_stock BOOLEAN
+    ) PARTITION BY RANGE (observed_at);
+
+    CREATE INDEX IF NOT EXISTS price_observations_observed_at_brin
+        ON price_observations USING BRIN (observed_at);
+    CREATE INDEX IF NOT EXISTS price_observations_product
+        ON price_observations (retailer, url, observed_at);
+
+    CREATE TABLE IF NOT EXISTS latest_prices (
+        retailer TEXT NOT NULL,
+        url VARCHAR(2000) NOT NULL,
+        observed_at TIMESTAMPTZ NOT NULL,
+        price NUMERIC(10,2),
+        regular_price NUMERIC(10,2),
+        title VARCHAR(255),
+        upc VARCHAR(50),
+        in_stock BOOLEAN,
+        PRIMARY KEY (retailer, url)
+    );
+
+    CREATE TABLE IF NOT EXISTS latest_prices_watermark (
+        id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+        refreshed_to TIMESTAMPTZ NOT NULL
+    );
+"""
+
+_lock = threading.Lock()
+_known_partitions = set()
+_schema_ready = False
+
+
+def _month_start(ts: datetime) -> datetime:
+    return datetime(ts.year, ts.month, 1, tzinfo=timezone.utc)
+
+
+def _next_month(month: datetime) -> datetime:
+    return datetime(month.year + month.month // 12, month.month % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+def partition_name(month: datetime) -> str:
+    return f"price_observations_{month.year:04d}_{month.month:02d}"
+
+
+def ensure_schema(cur):
+    """
+    Create the tables on first use, on the caller's cursor (so writers need no
+    manual `init`). Cached only once they are seen to exist, like the partitions.
+    """
+    global _schema_ready
+    if _schema_ready:
+        return
+    cur.execute("SELECT to_regclass('price_observations') IS NOT NULL AND to_regclass('latest_prices_watermark') IS NOT NULL")
+    if cur.fetchone()[0]:
+        _schema_ready = True
+        return
+    # Serialize creation across workers; released at commit
+    cur.execute("SELECT pg_advisory_xact_lock(hashtext('price_observations_schema'))")
+    cur.execute(SCHEMA)
+
+
+def ensure_partitions(cur, timestamps):
+    """Create the monthly partitions covering `timestamps` (once per process per month)."""
+    ensure_schema(cur)
+    months = {_month_start(ts.astimezone(timezone.utc)) for ts in timestamps}
+    with _lock:
+        missing = sorted(months - _known_partitions)
+    if not missing:
+        return
+    # Serialize partition creation across workers; released at commit
+    cur.execute("SELECT pg_advisory_xact_lock(hashtext('price_observations_partitions'))")
+    for month in missing:
+        cur.execute("SELECT to_regclass(%s) IS NOT NULL", (partition_name(month),))
+        if cur.fetchone()[0]:
+            # Only cache partitions that already existed, so a rolled back CREATE is retried
+            with _lock:
+                _known_partitions.add(month)
+            continue
+        cur.execute(f"""
+            CREATE TABLE {partition_name(month)}
+            PARTITION OF price_observations
+            FOR VALUES FROM (%s) TO (%s)
+        """, (month, _next_month(month)))
+
+
+def record_observations(cur, retailer, rows):
+    """
+    Append one observation per product (rows are tuples in OBSERVATION_COLUMNS order).
+    Runs on the caller's cursor, so history is written in the same transaction as the product rows.
+    """
+    by_url = {}
+    for row in rows:
+        if row[0] and row[0] != "N/A":
+            by_url[row[0]] = row
+    if not by_url:
+        return 0
+    ensure_partitions(cur, {row[1] for row in by_url.values()})
+    execute_values(cur, f"""
+        INSERT INTO price_observations (retailer, {", ".join(OBSERVATION_COLUMNS)}) VALUES %s
+    """, [(retailer,) + row for row in by_url.values()], page_size=PAGE_SIZE)
+    return len(by_url)
+
+
+def refresh_latest(cur) -> int:
+    """
+    Fold observations newer than the watermark (minus REFRESH_OVERLAP) into latest_prices.
+    Only the newest partitions are scanned. Returns the number of products updated.
+    """
+    ensure_schema(cur)
+    cur.execute("SELECT refreshed_to FROM latest_prices_watermark")
+    found = cur.fetchone()
+    since = found[0] - REFRESH_OVERLAP if found else datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+    cur.execute("""
+        INSERT INTO latest_prices (retailer, url, observed_at, price, regular_price, title, upc, in_stock)
+        SELECT DISTINCT ON (retailer, url)
+            retailer, url, observed_at, price, regular_price, title, upc, in_stock
+        FROM price_observations
+        WHERE observed_at >= %s
+        ORDER BY retailer, url, observed_at DESC
+        ON CONFLICT (retailer, url) DO UPDATE SET
+            observed_at = EXCLUDED.observed_at,
+            price = EXCLUDED.price,
+            regular_price = EXCLUDED.regular_price,
+            title = EXCLUDED.title,
+            upc = EXCLUDED.upc,
+            in_stock = EXCLUDED.in_stock
+        WHERE latest_prices.observed_at <= EXCLUDED.observed_at
+    """, (since,))
+    updated = cur.rowcount
+
+    cur.execute("SELECT max(observed_at) FROM price_observations WHERE observed_at >= %s", (since,))
+    newest = cur.fetchone()[0]
+    if newest is not None:
+        cur.execute("""
+            INSERT INTO latest_prices_watermark (id, refreshed_to) VALUES (TRUE, %s)
+            ON CONFLICT (id) DO UPDATE SET refreshed_to = GREATEST(latest_prices_watermark.refreshed_to, EXCLUDED.refreshed_to)
+        """, (newest,))
+    return updated
+
+
+def price_history(cur, retailer, url, days=90):
+    """(observed_at, price, regular_price) for one product over the last `days` days, oldest first."""
+    cur.execute("""
+        SELECT observed_at, price, regular_price
+        FROM price_observations
+        WHERE retailer = %s AND url = %s AND observed_at >= now() - make_interval(days => %s)
+        ORDER BY observed_at
+    """, (retailer, url, days))
+    return cur.fetchall()
+
+
+def create_schema(months_ahead=2):
+    """Create the tables and partitions for the current month and `months_ahead` after it."""
+    month = _month_start(datetime.now(timezone.utc))
+    months = [month]
+    for _ in range(months_ahead):
+        months.append(_next_month(months[-1]))
+    with get_connection() as conn, conn.cursor() as cur:
+        cur.execute(SCHEMA)
+        ensure_partitions(cur, months)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+    )
+    command = sys.argv[1] if len(sys.argv) > 1 else "refresh"
+    try:
+        if command == "init":
+            create_schema()
+            logging.info("price_observations schema is ready")
+        elif command == "refresh":
+            with get_connection() as conn, conn.cursor() as cur:
+                updated = refresh_latest(cur)
+            logging.info(f"latest_prices: {updated} products updated")
+        elif command == "history" and len(sys.argv) >= 4:
+            days = int(sys.argv[4]) if len(sys.argv) > 4 else 90
+            with get_connection() as conn, conn.cursor() as cur:
+                for observed_at, price, regular_price in price_history(cur, sys.argv[2], sys.argv[3], days):
+                    print(f"{observed_at:%Y-%m-%d %H:%M}  {price}  {regular_price}")
+        else:
+            print("Usage: python price_history.py [init | refresh | history <retailer> <url> [days]]")
+            sys.exit(2)
+    finally:
+        close_pool()
@@ -0,0 +1,122 @@
+import os
+import logging
+import threading
+from fnmatch import fnmatch
+
+# Request-interception profiles for the scraper browsers (CDP Fetch domain).
+#
+# Only requests matching a blocked resource type or URL pattern are paused by
+# Chromium; each one is failed unless it matches the allow-list. Everything
+# else (documents, first-party scripts, XHR for "Load more", PowerReviews
+# ratings, the Cloudflare challenge) never leaves the browser's fast path.
+#
+# BLOCK_PROFILE=off disables interception. Per-site lists can be extended with
+# BLOCK_TYPES, BLOCK_URLS and BLOCK_ALLOW (comma separated).
+
+BLOCK_PROFILE = os.getenv("BLOCK_PROFILE", "on").lower()
+
+PROFILES = {
+    # Category / grid pages: no images, video or fonts, no ads and analytics
+    "listing": {
+        "types": ["Image", "Media", "Font"],
+        "urls": [
+            "*googletagmanager.com*", "*google-analytics.com*", "*doubleclick.net*",
+            "*googlesyndication.com*", "*facebook.net*", "*facebook.com/tr*",
+            "*hotjar.com*", "*bat.bing.com*", "*analytics.tiktok.com*", "*criteo.*",
+            "*pinterest.com/ct*", "*clarity.ms*", "*nr-data.net*", "*newrelic.com*",
+        ],
+    },
+    # Product pages read for a single field: stylesheets can go too
+    "detail": {
+        "types": ["Image", "Media", "Font", "Stylesheet"],
+        "urls": [],  # filled from "listing" below
+    },
+}
+PROFILES["detail"]["urls"] = list(PROFILES["listing"]["urls"])
+
+# Never blocked: Cloudflare challenge assets and the site's own review widget
+ALLOW = [
+    "*challenges.cloudflare.com*", "*/cdn-cgi/*", "*cloudflareinsights.com*",
+    "*powerreviews.com*",
+]
+
+# Rough transfer sizes (bytes) used to estimate what a blocked request would have cost
+ESTIMATED_BYTES = {
+    "Image": int(os.getenv("BLOCK_EST_IMAGE_BYTES", 40_000)),
+    "Media": int(os.getenv("BLOCK_EST_MEDIA_BYTES", 500_000)),
+    "Font": int(os.getenv("BLOCK_EST_FONT_BYTES", 30_000)),
+    "Stylesheet": int(os.getenv("BLOCK_EST_STYLESHEET_BYTES", 25_000)),
+    "Script": int(os.getenv("BLOCK_EST_SCRIPT_BYTES", 60_000)),
+}
+DEFAULT_ESTIMATE = 10_000
+
+_lock = threading.Lock()
+stats = {"blocked": {}, "allowed": 0, "estimated_bytes_saved": 0, "tabs": 0, "failures": 0}
+
+
+def _env_list(name):
+    return [item.strip() for item in os.getenv(name, "").split(",") if item.strip()]
+
+
+def profile(name):
+    """Resource types, URL patterns and allow-list for a profile, with the env extensions applied."""
+    base = PROFILES[name]
+    return {
+        "types": base["types"] + [t for t in _env_list("BLOCK_TYPES") if t not in base["types"]],
+        "urls": base["urls"] + _env_list("BLOCK_URLS"),
+        "allow": ALLOW + _env_list("BLOCK_ALLOW"),
+    }
+
+
+def _record_blocked(resource_type):
+    with _lock:
+        stats["blocked"][resource_type] = stats["blocked"].get(resource_type, 0) + 1
+        stats["estimated_bytes_saved"] += ESTIMATED_BYTES.get(resource_type, DEFAULT_ESTIMATE)
+
+
+def enable(tab, name="listing"):
+    """
+    Start blocking on a DrissionPage tab/page. Must be called for every new tab,
+    since Fetch interception is per target. Returns False if it couldn't be enabled.
+    """
+    if BLOCK_PROFILE == "off":
+        return False
+    rules = profile(name)
+
+    def on_paused(**event):
+        url = event.get("request", {}).get("url", "")
+        resource_type = event.get("resourceType", "Other")
+        try:
+            if any(fnmatch(url, pattern) for pattern in rules["allow"]):
+                with _lock:
+                    stats["allowed"] += 1
+                tab.run_cdp("Fetch.continueRequest", requestId=event["requestId"])
+            else:
+                _record_blocked(resource_type)
+                tab.run_cdp("Fetch.failRequest", requestId=event["requestId"], errorReason="BlockedByClient")
+        except Exception as e:
+            logging.debug(f"Request interception failed for {url}: {e}")
+
+    patterns = [{"urlPattern": "*", "resourceType": t, "requestStage": "Request"} for t in rules["types"]]
+    patterns += [{"urlPattern": u, "requestStage": "Request"} for u in rules["urls"]]
+    try:
+        tab._driver.set_callback("Fetch.requestPaused", on_paused)
+        tab.run_cdp("Fetch.enable", patterns=patterns)
+    except Exception as e:
+        with _lock:
+            stats["failures"] += 1
+        logging.warning(f"Could not enable resource blocking: {e}")
+        return False
+    with _lock:
+        stats["tabs"] += 1
+    return True
+
+
+def log_stats():
+    with _lock:
+        blocked = sum(stats["blocked"].values())
+        by_type = ", ".join(f"{t} {n}" for t, n in sorted(stats["blocked"].items())) or "none"
+        logging.info(
+            f"Resource blocking: {blocked} requests blocked ({by_type}), {stats['allowed']} allow-listed, "
+            f"~{stats['estimated_bytes_saved'] / 1_048_576:.1f} MB saved (estimated) on {stats['tabs']} tabs"
+        )
@@ -0,0 +1,235 @@
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import importlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Non-interactive runner: scrapes Visions, Shoppers Drug Mart and Canada Computers
+# side by side, each with its own concurrency budget, sharing one DB pool.
+#
+# Config file (JSON), every key optional; CLI flags override it:
+#     {
+#         "db_pool_max": 8,
+#         "summary": "run_summary.json",
+#         "jobs": {
+#             "visions": {"categories": "all", "resume": true, "workers": 2},
+#             "shoppers": {"pages": "1-5"},                       # or {"url_file": "urls.txt", "tabs": 4}
+#             "canadacomputers": {"pages": "all", "concurrency": 4, "rate": 2}
+#         }
+#     }
+#
+#     python runner.py --config jobs.json
+#     python runner.py --only visions,canadacomputers --visions-workers 2 --cc-pages 1-10
+
+JOBS = ("visions", "shoppers", "canadacomputers")
+JOB_MODULES = {"visions": "checkscrape", "shoppers": "shoppersdrugmart", "canadacomputers": "canadacomputers"}
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+)
+
+
+def parse_pages(spec):
+    """"1-3, 5" -> [1, 2, 3, 5]; lists pass through."""
+    if isinstance(spec, list):
+        return [int(p) for p in spec]
+    pages = []
+    for part in str(spec).split(","):
+        part = part.strip()
+        if "-" in part:
+            start, end = map(int, part.split("-"))
+            pages.extend(range(start, end + 1))
+        elif part:
+            pages.append(int(part))
+    return pages
+
+
+def contiguous_runs(pages):
+    """[1, 2, 3, 7, 8] -> [(1, 3), (7, 8)]"""
+    runs = []
+    for page in sorted(set(pages)):
+        if runs and page == runs[-1][1] + 1:
+            runs[-1][1] = page
+        else:
+            runs.append([page, page])
+    return [tuple(run) for run in runs]
+
+
+# Jobs: each returns the number of items scraped (and may add extra summary fields)
+
+def run_visions_job(options, summary):
+    import checkscrape
+    categories = options.get("categories", "all")
+    category_ids = None if categories == "all" else [int(c) for c in categories]
+    checkpoint = checkscrape.visions_checkpoint(category_ids, resume=options.get("resume", True))
+    result = checkscrape.run_visions(checkpoint, workers=int(options.get("workers", checkscrape.VISIONS_WORKERS)))
+    summary.update(categories=result["categories"], complete=result["complete"])
+    return result["products"]
+
+
+def run_shoppers_job(options, summary):
+    import shoppersdrugmart
+    products = shoppersdrugmart.run_shoppers(
+        pages=parse_pages(options.get("pages", "1")),
+        url_file=options.get("url_file"),
+        output=options.get("output", "scraped_products.json"),
+        tabs=int(options.get("tabs", shoppersdrugmart.URL_TABS)),
+    )
+    return len(products)
+
+
+def run_canadacomputers_job(options, summary):
+    import canadacomputers
+    concurrency = int(options.get("concurrency", canadacomputers.CONCURRENCY))
+    rate = float(options.get("rate", canadacomputers.RATE_LIMIT))
+    pages = options.get("pages", "all")
+    if pages == "all":
+        stats = canadacomputers.scrape_all(concurrency=concurrency, rate=rate)
+    else:
+        # one fetch per contiguous range, so "1-3, 7" doesn't also scrape pages 4-6
+        stats = {"pages": 0, "products": 0, "errors": 0, "unchanged_pages": 0, "failed_pages": []}
+        for start, end in contiguous_runs(parse_pages(pages)):
+            run = canadacomputers.scrape_range(start, end, concurrency=concurrency, rate=rate)
+            for key in stats:
+                stats[key] += run[key]
+    summary.update(pages=stats["pages"], errors=stats["errors"], unchanged_pages=stats["unchanged_pages"],
+                   failed_pages=stats["failed_pages"])
+    return stats["products"]
+
+
+JOB_FUNCTIONS = {
+    "visions": run_visions_job,
+    "shoppers": run_shoppers_job,
+    "canadacomputers": run_canadacomputers_job,
+}
+
+
+def run_job(name, options):
+    summary = {"job": name, "status": "ok", "items": 0}
+    threading.current_thread().name = name
+    started = time.monotonic()
+    logging.info(f"[{name}] starting")
+    try:
+        summary["items"] = JOB_FUNCTIONS[name](options, summary)
+    except Exception as e:
+        logging.exception(f"[{name}] failed")
+        summary.update(status="failed", error=str(e))
+    summary["seconds"] = round(time.monotonic() - started, 2)
+    summary["items_per_sec"] = round(summary["items"] / summary["seconds"], 2) if summary["seconds"] else 0.0
+    logging.info(f"[{name}] {summary['status']}: {summary['items']} items in {summary['seconds']:.1f}s")
+    return summary
+
+
+def run_all(jobs):
+    """Run every job concurrently; returns the run summary."""
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=len(jobs)) as pool:
+        futures = [pool.submit(run_job, name, options) for name, options in jobs.items()]
+        results = [future.result() for future in futures]
+    total = time.monotonic() - started
+    return {
+        "seconds": round(total, 2),
+        "sum_of_job_seconds": round(sum(r["seconds"] for r in results), 2),
+        "jobs": results,
+    }
+
+
+def log_summary(summary):
+    logging.info("Run summary:")
+    for r in summary["jobs"]:
+        logging.info(
+            f"  {r['job']:<16} {r['status']:<7} {r['items']:>7} items  "
+            f"{r['seconds']:>8.1f}s  {r['items_per_sec']:>8.2f} items/sec"
+        )
+    logging.info(
+        f"  total {summary['seconds']:.1f}s wall clock "
+        f"(jobs back to back would take {summary['sum_of_job_seconds']:.1f}s)"
+    )
+
+
+def load_config(args):
+    config = {}
+    if args.config:
+        with open(args.config, "r", encoding="utf-8") as f:
+            config = json.load(f)
+    jobs = config.setdefault("jobs", {name: {} for name in JOBS})
+
+    if args.only:
+        wanted = [name.strip() for name in args.only.split(",") if name.strip()]
+        unknown = set(wanted) - set(JOBS)
+        if unknown:
+            raise SystemExit(f"Unknown job(s): {', '.join(sorted(unknown))}")
+        config["jobs"] = jobs = {name: jobs.get(name, {}) for name in wanted}
+
+    overrides = {
+        "visions": {"categories": args.visions_categories, "workers": args.visions_workers,
+                    "resume": False if args.no_resume else None},
+        "shoppers": {"pages": args.shoppers_pages, "url_file": args.shoppers_urls,
+                     "tabs": args.shoppers_tabs},
+        "canadacomputers": {"pages": args.cc_pages, "concurrency": args.cc_concurrency, "rate": args.cc_rate},
+    }
+    for name, values in overrides.items():
+        if name in jobs:
+            jobs[name].update({k: v for k, v in values.items() if v is not None})
+    if jobs.get("visions", {}).get("categories") not in (None, "all"):
+        categories = jobs["visions"]["categories"]
+        if isinstance(categories, str):
+            jobs["visions"]["categories"] = [int(c) for c in categories.split(",")]
+
+    if args.db_pool_max is not None:
+        config["db_pool_max"] = args.db_pool_max
+    if args.summary is not None:
+        config["summary"] = args.summary
+    return config
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the retailer scrapers concurrently.")
+    parser.add_argument("--config", help="JSON config file")
+    parser.add_argument("--only", help="comma separated jobs to run (default: all)")
+    parser.add_argument("--visions-categories", help='"all" or comma separated category ids')
+    parser.add_argument("--visions-workers", type=int)
+    parser.add_argument("--no-resume", action="store_true", help="start Visions fresh instead of resuming")
+    parser.add_argument("--shoppers-pages", help='e.g. "1-3, 5"')
+    parser.add_argument("--shoppers-urls", help="text file of product URLs (instead of pages)")
+    parser.add_argument("--shoppers-tabs", type=int, help="tabs loading product URLs at once")
+    parser.add_argument("--cc-pages", help='"all" or a range, e.g. "1-10"')
+    parser.add_argument("--cc-concurrency", type=int)
+    parser.add_argument("--cc-rate", type=float, help="requests/sec")
+    parser.add_argument("--db-pool-max", type=int, help="connections shared by all jobs")
+    parser.add_argument("--summary", help="write the run summary JSON here")
+    args = parser.parse_args(argv)
+
+    config = load_config(args)
+    if not config["jobs"]:
+        raise SystemExit("No jobs to run")
+
+    # The pool is sized from the environment when db is first imported
+    if config.get("db_pool_max"):
+        os.environ["DB_POOL_MAX"] = str(config["db_pool_max"])
+    from db import log_stats, close_pool
+    import metrics
+    metrics.start()
+    for name in config["jobs"]:
+        importlib.import_module(JOB_MODULES[name])  # import up front, not from the job threads
+
+    try:
+        summary = run_all(config["jobs"])
+    finally:
+        log_stats()
+        close_pool()
+
+    log_summary(summary)
+    if config.get("summary"):
+        with open(config["summary"], "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+    return 0 if all(r["status"] == "ok" for r in summary["jobs"]) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
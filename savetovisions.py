@@ -1,11 +1,14 @@
 import os
 import re
-import psycopg2
 from psycopg2.extras import execute_values
 import logging
 from datetime import datetime, timezone
 import json
+import time
 from dotenv import load_dotenv
+from db import get_connection, close_pool
+from price_history import ensure_partitions, record_observations
+from change_detection import content_hash
 
 
 load_dotenv()
@@ -45,43 +48,43 @@ logging.basicConfig(
     format="%(asctime)s - %(levelname)s - %(message)s",
 )
 
+VISIONS_COLUMNS = (
+    "url", "title", "brand", "model",
+    "current_price", "regular_price", "percentage_discount", "dollar_discount",
+    "eco_fee", "num_reviews", "avg_rating",
+    "main_category", "sale_ends", "upc", "created_at",
+)
+
+# Streaming loader tuning
+READ_CHUNK_SIZE = 1 << 16
+PROGRESS_EVERY = 50_000
+
+def visions_row(item: dict, now: datetime) -> tuple:
+    """Normalize one product dict into a visions row (column order = VISIONS_COLUMNS)."""
+    return (
+        item.get("url"),
+        item.get("title"),
+        item.get("brand"),
+        None if item.get("model") == "N/A" else item.get("model"),
+        clean_numeric(item.get("current_price")),
+        clean_numeric(item.get("regular_price")),
+        clean_numeric(item.get("percentage_discount"), percent=True),
+        clean_numeric(item.get("dollar_discount")),
+        clean_numeric(item.get("eco_fee")),
+        clean_numeric(item.get("num_reviews")),
+        clean_numeric(item.get("avg_rating")),
+        item.get("main_category"),
+        parse_date(item.get("sale_ends")),
+        item.get("upc"),
+        now  # created_at timestamp
+    )
+
 def save_to_visions(json_data: list[dict]):
     """Save parsed product JSON data into the visions table."""
     try:
-        database_url = os.getenv("DATABASE_URL")
-        if database_url:
-            conn = psycopg2.connect(database_url)
-        else:
-            conn = psycopg2.connect(
-                host=os.getenv("DB_HOST"),
-                port=os.getenv("DB_PORT", 5432),
-                dbname=os.getenv("DB_NAME"),
-                user=os.getenv("DB_USER"),
-                password=os.getenv("DB_PASS"),
-            )
-
         now = datetime.now(timezone.utc) # UTC timestamp / make sure created_at column is TIMESTAMPTZ
-        with conn, conn.cursor() as cur:
-            rows = [
-                (
-                    item.get("url"),
-                    item.get("title"),
-                    item.get("brand"),
-                    None if item.get("model") == "N/A" else item.get("model"),
-                    clean_numeric(item.get("current_price")),
-                    clean_numeric(item.get("regular_price")),
-                    clean_numeric(item.get("percentage_discount"), percent=True),
-                    clean_numeric(item.get("dollar_discount")),
-                    clean_numeric(item.get("eco_fee")),
-                    clean_numeric(item.get("num_reviews")),
-                    clean_numeric(item.get("avg_rating")),
-                    item.get("main_category"),
-                    parse_date(item.get("sale_ends")),
-                    item.get("upc"),
-                    now  # created_at timestamp
-                )
-                for item in json_data
-            ]
+        with get_connection() as conn, conn.cursor() as cur:
+            rows = [visions_row(item, now) for item in json_data]
 
             execute_values(
                 cur,
@@ -95,6 +98,10 @@ def save_to_visions(json_data: list[dict]):
                 """,
                 rows,
             )
+            record_observations(cur, "visions", [
+                (row[0], now, row[4], row[5], row[1], None if row[13] in (None, "N/A") else row[13], None)
+                for row in rows
+            ])
 
         logging.info("Saved %d products to Postgres.", len(rows))
 
@@ -102,26 +109,187 @@ def save_to_visions(json_data: list[dict]):
         logging.error("Failed to save data to visions: %s", e)
         raise
 
+# Streaming JSON / NDJSON reader
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
 
-def main():
-    """Entry point: load JSON file and save to visions table."""
-    json_file = "visions_clearance_products.json"  # 👈 replace with your filename
-    if not os.path.exists(json_file):
-        logging.error("JSON file not found: %s", json_file)
+def iter_json_products(f, chunk_size: int = READ_CHUNK_SIZE):
+    """
+    Yield product dicts one at a time from a JSON array or an NDJSON file,
+    holding at most one chunk plus one product in memory.
+    """
+    decoder = json.JSONDecoder()
+    buf = f.read(chunk_size)
+    pos = _WHITESPACE.match(buf).end()
+    while pos == len(buf):
+        chunk = f.read(chunk_size)
+        if not chunk:
+            return  # empty file
+        buf = chunk
+        pos = _WHITESPACE.match(buf).end()
+
+    # NDJSON: one object per line
+    if buf[pos] != "[":
+        pending = buf[pos:]
+        while True:
+            *lines, pending = pending.split("\n")
+            for line in lines:
+                if line.strip():
+                    yield json.loads(line)
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            pending += chunk
+        if pending.strip():
+            yield json.loads(pending)
         return
 
-    with open(json_file, "r", encoding="utf-8") as f:
-        try:
-            data = json.load(f)
-        except json.JSONDecodeError as e:
-            logging.error("Failed to parse JSON: %s", e)
+    # JSON array: decode items incrementally with raw_decode
+    pos += 1
+    eof = False
+    while True:
+        pos = _WHITESPACE.match(buf, pos).end()
+        if pos < len(buf) and buf[pos] == ",":
+            pos = _WHITESPACE.match(buf, pos + 1).end()
+        if pos < len(buf) and buf[pos] == "]":
             return
+        try:
+            if pos == len(buf):
+                raise json.JSONDecodeError("Need more data", buf, pos)
+            item, end = decoder.raw_decode(buf, pos)
+            if end == len(buf) and not eof:
+                raise json.JSONDecodeError("Item may continue in next chunk", buf, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buf = buf[pos:] + chunk
+            pos = 0
+            continue
+        yield item
+        pos = end
+
+def _copy_value(value) -> str:
+    """Format one value for COPY ... FROM STDIN (text format)."""
+    if value is None:
+        return "\\N"
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+class CopyStream:
+    """File-like wrapper that renders rows lazily for cursor.copy_expert."""
+
+    def __init__(self, rows):
+        self.rows = iter(rows)
+        self.count = 0
+        self.started = time.monotonic()
+        self._buf = ""
+
+    def read(self, size: int = -1) -> str:
+        parts = [self._buf]
+        length = len(self._buf)
+        while size < 0 or length < size:
+            row = next(self.rows, None)
+            if row is None:
+                break
+            line = "\t".join(_copy_value(v) for v in row) + "\n"
+            parts.append(line)
+            length += len(line)
+            self.count += 1
+            if self.count % PROGRESS_EVERY == 0:
+                logging.info("Streamed %d rows (%.0f rows/sec)", self.count, self.rate())
+        data = "".join(parts)
+        if size < 0:
+            self._buf = ""
+            return data
+        self._buf = data[size:]
+        return data[:size]
+
+    readline = read
 
-    if not isinstance(data, list):
-        logging.error("JSON root must be a list of products.")
+    def rate(self) -> float:
+        elapsed = time.monotonic() - self.started
+        return self.count / elapsed if elapsed > 0 else 0.0
+
+def copy_to_visions(items) -> int:
+    """
+    Bulk load an iterable of product dicts into visions via COPY.
+
+    Rows are streamed into a temporary staging table, then merged into visions
+    with ON CONFLICT (url, main_category) so reloading a file is idempotent.
+    Each row carries the same content_hash checkscrape's write_changed computes,
+    so the next scrape still skips rows this load left unchanged.
+    """
+    now = datetime.now(timezone.utc)
+    columns = ", ".join(VISIONS_COLUMNS)
+    stream = CopyStream(
+        row + (content_hash(row[:-1]),)  # fingerprint excludes created_at
+        for row in (visions_row(item, now) for item in items)
+    )
+    try:
+        with get_connection() as conn, conn.cursor() as cur:
+            cur.execute(f"""
+                CREATE TEMP TABLE visions_staging ON COMMIT DROP AS
+                SELECT {columns}, content_hash FROM visions WITH NO DATA
+            """)
+            cur.copy_expert(f"COPY visions_staging ({columns}, content_hash) FROM STDIN", stream)
+            copied = stream.count
+            copy_rate = stream.rate()
+
+            # Last occurrence of a (url, main_category) pair in the file wins
+            updates = ", ".join(
+                f"{c}=EXCLUDED.{c}" for c in VISIONS_COLUMNS + ("content_hash",) if c not in ("url", "main_category")
+            )
+            cur.execute(f"""
+                INSERT INTO visions ({columns}, content_hash)
+                SELECT DISTINCT ON (url, main_category) {columns}, content_hash
+                FROM visions_staging
+                ORDER BY url, main_category, ctid DESC
+                ON CONFLICT (url, main_category) DO UPDATE SET {updates}
+            """)
+
+            # Append the load to the price history
+            ensure_partitions(cur, [now])
+            cur.execute("""
+                INSERT INTO price_observations (retailer, url, observed_at, price, regular_price, title, upc)
+                SELECT DISTINCT ON (url) 'visions', url, created_at, current_price, regular_price, title, NULLIF(upc, 'N/A')
+                FROM visions_staging
+                WHERE url IS NOT NULL AND url <> 'N/A'
+                ORDER BY url, ctid DESC
+            """)
+
+        logging.info(
+            "Copied %d products to Postgres in %.1fs (%.0f rows/sec).",
+            copied, time.monotonic() - stream.started, copy_rate,
+        )
+        return copied
+
+    except Exception as e:
+        logging.error("Failed to copy data to visions: %s", e)
+        raise
+
+
+def main():
+    """Entry point: stream the JSON (or NDJSON) file into the visions table."""
+    json_file = os.getenv("VISIONS_JSON_FILE", "visions_clearance_products.json")
+    if not os.path.exists(json_file):
+        logging.error("JSON file not found: %s", json_file)
         return
 
-    save_to_visions(data)
+    try:
+        with open(json_file, "r", encoding="utf-8") as f:
+            copy_to_visions(iter_json_products(f))
+    except json.JSONDecodeError as e:
+        logging.error("Failed to parse JSON: %s", e)
+    finally:
+        close_pool()
 
 
 if __name__ == "__main__":
@@ -1,44 +1,86 @@
-from DrissionPage import ChromiumPage
-import time
+from DrissionPage import ChromiumPage, ChromiumOptions
 import re
 import json
 from datetime import datetime, timezone
 from dotenv import load_dotenv
 from parsel import Selector
 import os
+import logging
+import queue
+import threading
+import requests
+from concurrent.futures import ThreadPoolExecutor
+import metrics
+import resource_blocking
 from urllib.parse import urlparse
-import psycopg2
+from browser_session import BrowserSession
+from db import get_connection, log_stats, close_pool
+from change_detection import write_changed, log_stats as log_change_stats
+from price_history import record_observations
+from waits import wait_for_dom_ready, wait_for_selector, scroll_until_stable, log_wait_stats
 
 load_dotenv()
 
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+)
+
+# Own debugging port/profile so this browser can run next to the Visions ones
+SHOPPERS_DEBUG_PORT = int(os.getenv("SHOPPERS_DEBUG_PORT", 9322))
+SHOPPERS_PROFILE = os.getenv("SHOPPERS_PROFILE", "/tmp/shoppers-profile")
+
+# URL mode
+URL_TABS = int(os.getenv("SHOPPERS_TABS", 4))  # tabs loading at once
+URL_TIMEOUT = float(os.getenv("SHOPPERS_URL_TIMEOUT", 30))  # seconds per page load
+URL_RETRIES = int(os.getenv("SHOPPERS_URL_RETRIES", 1))  # extra rounds for URLs that did not load
+SAVE_BATCH_SIZE = int(os.getenv("SHOPPERS_SAVE_BATCH", 50))
+
+# Product pages are tried over plain HTTP first; only failures open a browser tab
+HTTP_FIRST = os.getenv("SHOPPERS_HTTP_FIRST", "true").lower() == "true"
+HTTP_WORKERS = int(os.getenv("SHOPPERS_HTTP_WORKERS", 4))
+HTTP_TIMEOUT = float(os.getenv("SHOPPERS_HTTP_TIMEOUT", 15))
+
+http_session = requests.Session()
+http_session.headers.update({
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+                  "(KHTML, like Gecko) Chrome/124.0 Safari/537.36",
+    "Accept": "text/html,application/xhtml+xml",
+    "Accept-Language": "en-CA,en;q=0.9",
+})
+
+def browser_options() -> ChromiumOptions:
+    options = ChromiumOptions()
+    options.set_local_port(SHOPPERS_DEBUG_PORT)
+    options.set_user_data_path(SHOPPERS_PROFILE)
+    # background tabs must keep rendering while several load at once
+    for argument in ("--disable-background-timer-throttling",
+                     "--disable-renderer-backgrounding",
+                     "--disable-backgrounding-occluded-windows"):
+        options.set_argument(argument)
+    return options
+
 
 def scrape_by_page(pages):
     scraped_data = []
-    for page_num in pages:
-        print(f"Scraping page {page_num}")
-        url = f"https://www.shoppersdrugmart.ca/shop/categories/offers/c/FS-Offers?nav=%2Fshop%2Fcategories%2Foffers&q=trending&showInStock=true&page={page_num}&sort=top-rated&promotions=PC%2BOptimum%2BOffer&promotions=Sale&promotions=Clearance"
-        page_data = scrape_page(url)
-        scraped_data.extend(page_data)
+    # one warm browser for all pages, recycled by BrowserSession when needed
+    with BrowserSession(options=browser_options(), block_profile="listing") as browser:
+        for page_num in pages:
+            print(f"Scraping page {page_num}")
+            url = f"https://www.shoppersdrugmart.ca/shop/categories/offers/c/FS-Offers?nav=%2Fshop%2Fcategories%2Foffers&q=trending&showInStock=true&page={page_num}&sort=top-rated&promotions=PC%2BOptimum%2BOffer&promotions=Sale&promotions=Clearance"
+            page_data = scrape_page(url, browser)
+            scraped_data.extend(page_data)
     return scraped_data
 
 
-def save_product(product: dict):
-    """
-    Save a single scraped product into PostgreSQL.
-    """
-    # Connect to database
-    DATABASE_URL = os.getenv("DATABASE_URL")
-    if DATABASE_URL:
-        conn = psycopg2.connect(DATABASE_URL)
-    else:
-        conn = psycopg2.connect(
-            host=os.getenv("DB_HOST"),
-            port=os.getenv("DB_PORT", 5432),
-            dbname=os.getenv("DB_NAME"),
-            user=os.getenv("DB_USER"),
-            password=os.getenv("DB_PASS"),
-        )
+SHOPPERS_COLUMNS = [
+    "bytype", "title", "brand", "rating", "review",
+    "price", "old_price", "promotion_type", "promo_ends",
+    "url", "scraped_at", "img_urls", "percentage_discount", "dollar_discount",
+]
 
+def product_row(product: dict) -> tuple:
+    """Normalize a scraped product into a shoppersdrugmart row (column order = SHOPPERS_COLUMNS)."""
     # Normalize img_urls
     img_urls = product.get("img_urls")
     if isinstance(img_urls, str):  # By Page
@@ -49,7 +91,7 @@ def save_product(product: dict):
     review = clean_reviews(product.get("review"))
     price = clean_numeric(product.get("price"))
     old_price = clean_numeric(product.get("old_price"))
-    if old_price > 0 and price > 0:
+    if (old_price or 0) > 0 and (price or 0) > 0:  # clean_numeric gives None for unparseable text
         dollar_discount = old_price - price
         percentage_discount = (dollar_discount / old_price) * 100
     else:
@@ -58,76 +100,57 @@ def save_product(product: dict):
     # Default current time if not provided
     scraped_at = product.get("scraped_at") or datetime.now(timezone.utc).isoformat()
 
-    with conn:
-        with conn.cursor() as cur:
-            # Check if the product exists by URL
-            check_url_query = """
-                SELECT 1 FROM shoppersdrugmart WHERE url = %s
-            """
-            cur.execute(check_url_query, (product.get('url'),))
-            existing_product = cur.fetchone()
-
-            if existing_product:
-                # Update existing record
-                update_query = """
-                UPDATE shoppersdrugmart
-                SET bytype = %s, title = %s,
-                    brand = %s,
-                    rating = %s,
-                    review = %s,
-                    price = %s,
-                    old_price = %s,
-                    promotion_type = %s,
-                    promo_ends = %s,
-                    scraped_at = %s,
-                    img_urls = %s,
-                    percentage_discount = %s,
-                    dollar_discount = %s
-                WHERE url = %s
-                """
-                cur.execute(update_query, (
-                    product.get("type"),
-                    product.get("title"),
-                    product.get("brand"),
-                    rating,
-                    review,
-                    price,
-                    old_price,
-                    product.get("promotion_type"),
-                    product.get("promo_ends"),
-                    scraped_at,
-                    img_urls,
-                    percentage_discount,
-                    dollar_discount,
-                    product.get("url")
-                ))
-            else:
-                # Insert new product record
-                insert_query = """
-                INSERT INTO shoppersdrugmart (
-                    bytype, title, brand, rating, review,
-                    price, old_price, promotion_type, promo_ends,
-                    url, scraped_at, img_urls, percentage_discount, dollar_discount
-                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                """
-                cur.execute(insert_query, (
-                    product.get("type"),
-                    product.get("title"),
-                    product.get("brand"),
-                    rating,
-                    review,
-                    price,
-                    old_price,
-                    product.get("promotion_type"),
-                    product.get("promo_ends"),
-                    product.get("url"),
-                    scraped_at,
-                    img_urls,
-                    percentage_discount,
-                    dollar_discount
-                ))
-
-    conn.close()
+    return (
+        product.get("type"),
+        product.get("title"),
+        product.get("brand"),
+        rating,
+        review,
+        price,
+        old_price,
+        product.get("promotion_type"),
+        product.get("promo_ends"),
+        product.get("url"),
+        scraped_at,
+        img_urls,
+        percentage_discount,
+        dollar_discount,
+    )
+
+def save_products(products: list, cur=None):
+    """
+    Save a batch of scraped products into PostgreSQL (on `cur` when given, so the
+    caller can commit other work in the same transaction).
+    Products whose content is unchanged since the last run only get scraped_at updated.
+    Every product is also appended to price_observations.
+    """
+    if not products:
+        return
+    category = products[0].get("type")
+    with metrics.stage("normalize", "shoppersdrugmart", category):
+        rows = [product_row(product) for product in products]
+    observations = []
+    for row in rows:
+        p = dict(zip(SHOPPERS_COLUMNS, row))
+        observed_at = p["scraped_at"]
+        if isinstance(observed_at, str):
+            observed_at = datetime.fromisoformat(observed_at)
+        regular_price = p["old_price"] if p["old_price"] else p["price"]
+        observations.append((p["url"], observed_at, p["price"], regular_price, p["title"], None, None))
+    with metrics.stage("db_write", "shoppersdrugmart", category):
+        if cur is not None:
+            write_changed(cur, "shoppersdrugmart", ["url"], SHOPPERS_COLUMNS, rows, seen_column="scraped_at")
+            record_observations(cur, "shoppersdrugmart", observations)
+            return
+        with get_connection() as conn, conn.cursor() as cur:
+            write_changed(cur, "shoppersdrugmart", ["url"], SHOPPERS_COLUMNS, rows, seen_column="scraped_at")
+            record_observations(cur, "shoppersdrugmart", observations)
+
+def save_product(product: dict):
+    """
+    Save a single scraped product into PostgreSQL.
+    """
+    save_products([product])
 
     """
     update table Schema for the table
@@ -147,6 +170,7 @@ def save_product(product: dict):
             img_urls TEXT[], -- Store image URLs as an array of text
             percentage_discount DECIMAL(5, 2),
             dollar_discount DECIMAL(10, 2),
+            content_hash TEXT, -- Fingerprint of the content fields, see change_detection.py
             CONSTRAINT unique_url UNIQUE (url) -- Ensure the URL is unique
         );
 
@@ -196,20 +220,9 @@ def clean_reviews(val):
         return None
 
 # Scraping by URLs'
-def scrape_url_page(tab):
-    """Scrape a single product URL page from its tab"""
-    tab.wait(10)
-
-    last_height = tab._run_js("return document.body.scrollHeight")
-    while True:
-        tab._run_js("window.scrollTo(0, document.body.scrollHeight);")
-        time.sleep(3)
-        new_height = tab._run_js("return document.body.scrollHeight")
-        if new_height == last_height:
-            break
-        last_height = new_height
-
-    sel = Selector(text=tab.html)
+def parse_product_page(html: str, url: str) -> dict:
+    """Parse a product detail page's HTML into an item (no browser needed)."""
+    sel = Selector(text=html)
 
     brand = sel.css("p.plp__brandName__8MSID a::text").get()
     title = sel.css("h1.plp__pageHeading__zUcEq::text").get()
@@ -217,19 +230,18 @@ def scrape_url_page(tab):
     review = sel.css("a.pr-snippet-review-count::text").get()
 
     # price container element
-    price_container = tab.ele('css:p[data-testid="price-container"]')
+    price_container = sel.css('p[data-testid="price-container"]')
 
     price = None
     old_price = None
 
     if price_container:
         # check for strike-through old price
-        old_price_el = price_container.ele('css:span.plp__priceStrikeThrough__2MAlQ')
-        old_price = old_price_el.text if old_price_el else None
+        old_price = "".join(price_container.css('span.plp__priceStrikeThrough__2MAlQ ::text').getall()).strip() or None
 
         # current price is the text outside the strike-through span
         # remove inner span text if exists
-        price_text = price_container.text
+        price_text = "".join(price_container.css('::text').getall())
         if old_price:
             price = price_text.replace(old_price, "").strip()
         else:
@@ -238,214 +250,503 @@ def scrape_url_page(tab):
         # fallback: if price missing but old_price exists
         if not price and old_price:
             price = old_price
-        
+
         price = extract_price(price)
         old_price = extract_price(old_price)
-        
-    img_urls = []
-    carousel_imgs = tab.eles('css:ul.plp__list__1QwAH li img.plp__image__WzRYO')
-    for img in carousel_imgs:
-        src = img.attr('src')
-        if src:
-            img_urls.append(src)
+
+    img_urls = [src for src in sel.css('ul.plp__list__1QwAH li img.plp__image__WzRYO::attr(src)').getall() if src]
 
     promo_type = sel.css("div.plp__offerContainer__2pipm > h3::text").get()
     promo_raw_date = sel.css("div.plp__offerContainer__2pipm > p > span.plp__date__1U7ai::text").get()
     promo_ends = parse_promo_date(promo_raw_date)
 
-    item = {
+    return {
         "type": "By URL",
         "title": title.strip() if title else None,
         "brand": brand.strip() if brand else None,
-        "rating": rating.strip() if rating else "0.0",
-        "review": review.strip() if review else "0",
+        "rating": _rating_text(rating),
+        "review": _count_text(review),
         "price": price.strip() if price else None,
         "old_price": old_price.strip() if old_price else None,
         "promotion_type": promo_type.strip() if promo_type else None,
         "promo_ends": promo_ends,
-        "url": tab.url,
+        "url": url,
         "scraped_at": datetime.now(timezone.utc).isoformat(),
         "img_urls": img_urls
     }
 
-    return item
+# Structured data (JSON-LD / hydration state) embedded in the initial HTML
+STRUCTURED_SCRIPTS = 'script[type="application/ld+json"]::text, script#__NEXT_DATA__::text, script[type="application/json"]::text'
+STRIKETHROUGH_TYPES = ("StrikethroughPrice", "ListPrice")
+
+def _find_product(data):
+    """Depth-first search for the first schema.org Product object in parsed JSON."""
+    stack = [data]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            node_type = node.get("@type")
+            types = node_type if isinstance(node_type, list) else [node_type]
+            if "Product" in types and node.get("name"):
+                return node
+            stack.extend(reversed(list(node.values())))
+        elif isinstance(node, list):
+            stack.extend(reversed(node))
+    return None
+
+def _first(value):
+    return value[0] if isinstance(value, list) and value else value
+
+def _rating_text(value):
+    """'4.7', 4.7 or 5 -> '4.7' / '5.0'; same format from the DOM and the structured path."""
+    try:
+        return f"{float(str(value).strip()):.1f}"
+    except (TypeError, ValueError):
+        return "0.0"
 
-# Get text(.txt) files then loop through it then calls scrape_url_page to scrape per tab
-def scrape_urls_from_file(filename):
-    """Read URLs from file, auto-detect root URL, then scrape each URL in new tabs"""
-    if not os.path.exists(filename):
-        print(f"File not found: {filename}")
-        return []
+def _count_text(value):
+    """'212 Reviews', 212 or '1,024' -> '212' / '1024'."""
+    match = re.search(r"\d[\d,]*", str(value or ""))
+    return match.group(0).replace(",", "") if match else "0"
 
-    with open(filename, "r", encoding="utf-8") as f:
-        urls = [line.strip() for line in f if line.strip()]
+def _price_text(value):
+    if value in (None, ""):
+        return None
+    try:
+        return f"${float(str(value).replace('$', '').replace(',', '')):.2f}"
+    except ValueError:
+        return extract_price(str(value))
 
-    if not urls:
-        print("No URLs found in file.")
+def parse_structured_data(html: str, url: str, sel=None):
+    """
+    Read the product from the page's embedded JSON-LD / hydration state.
+    Returns an item like parse_product_page, or None when the page carries no
+    usable Product data. Promotion details are not part of schema.org Product,
+    so they are still read from the static markup.
+    """
+    sel = sel or Selector(text=html)
+    product = None
+    for raw in sel.css(STRUCTURED_SCRIPTS).getall():
+        try:
+            product = _find_product(json.loads(raw))
+        except ValueError:
+            continue
+        if product:
+            break
+    if not product:
+        return None
+    try:
+        return _structured_item(product, sel, url)
+    except (AttributeError, TypeError, KeyError, ValueError) as e:
+        # shapes schema.org allows but we don't read: let the DOM path handle the page
+        logging.debug(f"Unreadable structured data on {url}: {e}")
+        return None
+
+def _structured_item(product, sel, url):
+    brand = _first(product.get("brand"))
+    if isinstance(brand, dict):
+        brand = brand.get("name")
+    rating = _first(product.get("aggregateRating")) or {}
+
+    offer = _first(product.get("offers")) or {}
+    price = _price_text(offer.get("price") or offer.get("lowPrice"))
+    old_price = None
+    specs = offer.get("priceSpecification") or []
+    if isinstance(specs, dict):
+        specs = [specs]
+    for spec in specs:
+        if isinstance(spec, dict) and str(spec.get("priceType", "")).rsplit("/", 1)[-1] in STRIKETHROUGH_TYPES:
+            old_price = _price_text(spec.get("price"))
+    if old_price == price:
+        old_price = None
+
+    images = product.get("image") or []
+    if isinstance(images, (str, dict)):
+        images = [images]
+    img_urls = [image.get("url") if isinstance(image, dict) else image for image in images]
+
+    promo_type = sel.css("div.plp__offerContainer__2pipm > h3::text").get()
+    promo_raw_date = sel.css("div.plp__offerContainer__2pipm > p > span.plp__date__1U7ai::text").get()
+
+    return {
+        "type": "By URL",
+        "title": str(product["name"]).strip(),
+        "brand": str(brand).strip() if brand else None,
+        "rating": _rating_text(rating.get("ratingValue")),
+        "review": _count_text(rating.get("reviewCount") or rating.get("ratingCount")),
+        "price": price,
+        "old_price": old_price,
+        "promotion_type": promo_type.strip() if promo_type else None,
+        "promo_ends": parse_promo_date(promo_raw_date),
+        "url": url,
+        "scraped_at": datetime.now(timezone.utc).isoformat(),
+        "img_urls": [u for u in img_urls if u]
+    }
+
+def has_product_data(item):
+    return bool(item and item.get("title") and item.get("brand"))
+
+def has_price(item):
+    """A price that parses to a positive number; a page without one may still be rendering it."""
+    return bool(item and clean_numeric(item.get("price")))
+
+def extract_product(html: str, url: str) -> dict:
+    """Structured data first, DOM selectors only when it is missing or incomplete."""
+    sel = Selector(text=html)
+    item = parse_structured_data(html, url, sel)
+    if has_product_data(item):
+        metrics.count("structured_data", "shoppersdrugmart", "By URL")
+        return item
+    metrics.count("dom_fallback", "shoppersdrugmart", "By URL")
+    return parse_product_page(html, url)
+
+def scrape_url_page(tab):
+    """Scrape a single product URL page from its tab"""
+    with metrics.stage("wait_scroll", "shoppersdrugmart", "By URL"):
+        wait_for_dom_ready(tab, site="shoppers")
+    # Embedded structured data is in the initial HTML: no scrolling needed
+    with metrics.stage("extract", "shoppersdrugmart", "By URL"):
+        item = parse_structured_data(tab.html, tab.url)
+    if has_product_data(item):
+        metrics.count("structured_data", "shoppersdrugmart", "By URL")
+        return item
+
+    metrics.count("dom_fallback", "shoppersdrugmart", "By URL")
+    with metrics.stage("wait_scroll", "shoppersdrugmart", "By URL"):
+        scroll_until_stable(tab, site="shoppers")
+    with metrics.stage("extract", "shoppersdrugmart", "By URL"):
+        return parse_product_page(tab.html, tab.url)
+
+def fetch_product_page(url, timeout=HTTP_TIMEOUT):
+    """
+    Try a product page over plain HTTP. Returns the item when the response carries
+    complete product data (structured, or static DOM) including a price, else None
+    so the URL goes to the browser.
+    """
+    try:
+        with metrics.stage("page_load", "shoppersdrugmart", "By URL (HTTP)"):
+            resp = http_session.get(url, timeout=timeout)
+        if resp.status_code != 200:
+            return None
+    except requests.RequestException:
+        return None
+    try:
+        with metrics.stage("extract", "shoppersdrugmart", "By URL (HTTP)"):
+            item = extract_product(resp.text, url)
+    except Exception as e:
+        logging.debug(f"Could not parse {url} fetched over HTTP: {e}")
+        return None  # left for the browser
+    return item if has_product_data(item) and has_price(item) else None
+
+def fetch_products_over_http(jobs, workers=HTTP_WORKERS, save=True):
+    """
+    Fetch (index, url) jobs without a browser. Saves what loads (when `save`); returns
+    ({index: item}, [(index, url) left for the browser], [index of items not saved]).
+    """
+    loaded, remaining, unsaved = {}, [], []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        items = pool.map(lambda job: fetch_product_page(job[1]), jobs)
+        for (index, url), item in zip(jobs, items):
+            if item:
+                loaded[index] = item
+                metrics.count("items", "shoppersdrugmart", "By URL (HTTP)")
+                print(f"Scraped {index + 1} over HTTP: {item['title']} at {url}")
+            else:
+                remaining.append((index, url))
+    batch = sorted(loaded) if save else []
+    for start in range(0, len(batch), SAVE_BATCH_SIZE):
+        unsaved += save_url_batch(loaded, batch[start:start + SAVE_BATCH_SIZE])
+    return loaded, remaining, unsaved
+
+def _url_worker(tab, work, results):
+    """Load URLs from the work queue in one tab until the queue is empty."""
+    while True:
+        try:
+            index, url = work.get_nowait()
+        except queue.Empty:
+            return
+        item = None
+        try:
+            with metrics.stage("page_load", "shoppersdrugmart", "By URL"):
+                tab.get(url, timeout=URL_TIMEOUT)
+            item = scrape_url_page(tab)
+        except Exception as e:
+            print(f"Error scraping {url}: {e}")
+        results.put((index, url, item))
+
+def scrape_url_batch(page, jobs, tabs=URL_TABS, save=True):
+    """
+    Scrape (index, url) jobs with up to `tabs` tabs loading at once, saving loaded
+    products in batches (when `save`). Returns ({index: item}, [(index, url) not loaded], [index of items not saved]).
+    """
+    work = queue.Queue()
+    for job in jobs:
+        work.put(job)
+    results = queue.Queue()
+
+    # tabs are created up front on the calling thread, then handed to workers
+    tab_list = []
+    for _ in range(min(tabs, len(jobs))):
+        tab = page.new_tab()
+        resource_blocking.enable(tab, "detail")
+        tab_list.append(tab)
+    workers = [threading.Thread(target=_url_worker, args=(tab, work, results), daemon=True) for tab in tab_list]
+    for worker in workers:
+        worker.start()
+
+    loaded, failed, batch, unsaved = {}, [], [], []
+    try:
+        while any(worker.is_alive() for worker in workers) or not results.empty():
+            try:
+                index, url, item = results.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            # Check if necessary fields are empty or None
+            if has_product_data(item):  # If title and brand are present
+                loaded[index] = item
+                if save:
+                    batch.append(index)
+                metrics.count("items", "shoppersdrugmart", "By URL")
+                print(f"Scraped {index + 1}: {item['title']} at {url}")
+                if len(batch) >= SAVE_BATCH_SIZE:
+                    unsaved += save_url_batch(loaded, batch)
+                    batch = []
+            else:
+                failed.append((index, url))
+                metrics.count("skipped", "shoppersdrugmart", "By URL")
+                print(f"Skipping product due to unloaded data:: {url}")
+        unsaved += save_url_batch(loaded, batch)
+    finally:
+        for tab in tab_list:
+            try:
+                tab.close()
+            except Exception:
+                pass
+    return loaded, failed, unsaved
+
+def save_url_batch(loaded, indexes):
+    """Save loaded[i] for each index in one transaction; returns the indexes that could not be saved."""
+    if not indexes:
         return []
+    try:
+        save_products([loaded[index] for index in indexes])
+    except Exception as e:
+        metrics.count("save_errors", "shoppersdrugmart", "By URL", len(indexes))
+        print(f"Error saving {len(indexes)} products: {e}")
+        return list(indexes)
+    return []
+
+def scrape_urls(jobs, tabs=URL_TABS, save=True):
+    """
+    Scrape (index, url) jobs: over HTTP first when enabled, then the rest in `tabs`
+    concurrent browser tabs with retry rounds. Loaded products are saved in batches
+    unless `save` is False, in which case the caller stores them.
+    Returns ({index: item}, [(index, url) not loaded], [index of loaded items that could not be saved]).
+    """
+    pending = list(jobs)
+    loaded, unsaved = {}, []
+    if HTTP_FIRST:
+        loaded, pending, unsaved = fetch_products_over_http(pending, save=save)
+        print(f"\n{len(loaded)} of {len(jobs)} URLs loaded over HTTP, {len(pending)} left for the browser")
+        if not pending:
+            return loaded, [], unsaved
 
     # Auto-detect root URL from the first URL
-    parsed = urlparse(urls[0])
+    parsed = urlparse(pending[0][1])
     root_url = f"{parsed.scheme}://{parsed.netloc}"
 
-    page = ChromiumPage()
-    scraped_results = []
+    page = ChromiumPage(addr_or_opts=browser_options())
+    resource_blocking.enable(page, "listing")
 
     try:
         # open root page first
         print(f"Opening root page: {root_url}")
         page.get(root_url)
-        page.wait(10)
-
-        for i, url in enumerate(urls, 1):
-            print(f"\nOpening product URL {i}/{len(urls)}: {url}")
-            tab = page.new_tab(url)
-            page.activate_tab(tab)
-
-            try:
-                item = scrape_url_page(tab)
-
-                # Check if necessary fields are empty or None
-                if item.get("title") and item.get("brand"):  # If title and brand are present
-                    scraped_results.append(item)
-                    print(f"Scraped: {item['title']} at {url}")
-                    save_product(item)
-                else:
-                    print(f"Skipping product due to unloaded data:: {url}")
-            except Exception as e:
-                print(f"Error scraping {url}: {e}")
-            finally:
-                tab.close()
+        wait_for_dom_ready(page, site="shoppers")
+
+        for attempt in range(URL_RETRIES + 1):
+            if attempt:
+                print(f"\nRetrying {len(pending)} URLs that did not load")
+            done, pending, not_saved = scrape_url_batch(page, pending, tabs, save)
+            loaded.update(done)
+            unsaved += not_saved
+            if not pending:
+                break
+        for _, url in pending:
+            print(f"Gave up on {url}")
 
     finally:
         page.quit()
 
+    return loaded, pending, unsaved
+
+# Get text(.txt) files then scrape the URLs
+def scrape_urls_from_file(filename, tabs=URL_TABS):
+    """Read URLs from file, then scrape them with scrape_urls; returns the products in file order"""
+    if not os.path.exists(filename):
+        print(f"File not found: {filename}")
+        return []
+
+    with open(filename, "r", encoding="utf-8") as f:
+        urls = [line.strip() for line in f if line.strip()]
+
+    if not urls:
+        print("No URLs found in file.")
+        return []
+
+    loaded, _, unsaved = scrape_urls(list(enumerate(urls)), tabs)
+    if unsaved:
+        # one more attempt for batches whose write failed, then report what is still missing
+        print(f"\nRetrying the save of {len(unsaved)} products")
+        unsaved = save_url_batch(loaded, sorted(unsaved))
+        for index in unsaved:
+            print(f"Not saved to the database: {urls[index]}")
     print(f"\nFinished scraping {len(urls)} URLs from {filename}")
-    return scraped_results
+    return [loaded[index] for index in sorted(loaded)]
+
+PRICE_RE = re.compile(r'\$\s*\d{1,3}(?:[,\d{3}]*)?(?:\.\d{1,2})?')  # matches $10.99, $1,234.56
+PLAIN_PRICE_RE = re.compile(r'\d+\.\d{2}')
+
+def extract_price_from_textnodes(text_nodes):
+    """Given a list of text nodes (e.g. ['sale', ' $10.99']), return the $ amount or None."""
+    if not text_nodes:
+        return None
+    combined = " ".join(t.strip() for t in text_nodes if t and t.strip())
+    m = PRICE_RE.search(combined)
+    if m:
+        # normalize spacing and commas kept for readability, you can strip commas if you want numeric
+        return m.group().replace(" ", "")
+    # fallback: maybe price without $ (e.g. '10.99')
+    m2 = PLAIN_PRICE_RE.search(combined)
+    if m2:
+        return m2.group()
+    return None
+
+def parse_product_grid(html: str) -> list:
+    """Parse the product grid's HTML into "By Page" items (no browser needed)."""
+    sel = Selector(text=html)
+    scraped_data = []
+    for i, product in enumerate(sel.css('div.chakra-linkbox')):
+        try:
+            title = product.css('[data-testid="product-title"]::text').get()
+            brand = product.css('[data-testid="product-brand"]::text').get()
+            img_url = product.css('[data-testid="product-image"] img::attr(src)').get()
+            product_link = product.css('a.chakra-linkbox__overlay::attr(href)').get()
+
+            # get text nodes for price and was-price (span + following text nodes)
+            price_text_nodes = product.css('p[data-testid="price"]::text').getall()
+            if not price_text_nodes:
+                # alternate container fallback
+                price_text_nodes = product.css('[data-testid="price-product-tile"] p[data-testid="price"]::text').getall()
+
+            was_text_nodes = product.css('p[data-testid="was-price"]::text').getall()
+            if not was_text_nodes:
+                was_text_nodes = product.css('[data-testid="price-product-tile"] p[data-testid="was-price"]::text').getall()
+
+            price = extract_price_from_textnodes(price_text_nodes)
+            old_price = extract_price_from_textnodes(was_text_nodes)
+
+            # If price is missing but old_price exists, use old_price as price
+            if not price and old_price:
+                price = old_price
+
+            # collect promotion badges (can be multiple)
+            promos = product.css('[data-testid="product-deal-badge"]::text').getall()
+            pco = product.css('[data-testid="product-pco-badge"]::text').getall()
+            badges = [p.strip() for p in (promos + pco) if p and p.strip()]
+            promotion_type = ", ".join(badges) if badges else None
+
+            scraped_data.append({
+                "type": "By Page",
+                "title": title,
+                "brand": brand,
+                "rating": 0,
+                "review": 0,
+                "price": price,
+                "old_price": old_price,
+                "promotion_type": promotion_type,
+                "promo_ends": None,
+                "url": product_link,
+                "scraped_at": datetime.now(timezone.utc).isoformat(),
+                "img_urls": img_url,
+            })
+        except Exception as e:
+            print(f"Error scraping product {i+1}: {e}")
+            continue
+    return scraped_data
 
 # Scraping by page[1-2, 5, 5-7]
-def scrape_page(url: str):
-    page = ChromiumPage()
+def scrape_page(url: str, browser: BrowserSession = None):
+    own_browser = browser is None
+    if own_browser:
+        browser = BrowserSession(options=browser_options(), block_profile="listing")
+    page = browser.acquire()
     try:
-        page.get(url)
-
-        last_height = page._run_js("return document.body.scrollHeight")
-        while True:
-            page._run_js("window.scrollTo(0, document.body.scrollHeight);")
-            time.sleep(3)
-            new_height = page._run_js("return document.body.scrollHeight")
-            if new_height == last_height:
-                break
-            last_height = new_height
-            
-            
-        product_grid = page.wait(10).ele('xpath://div[@data-testid="product-grid"]')
+        with metrics.stage("page_load", "shoppersdrugmart", "By Page"):
+            page.get(url)
+            wait_for_selector(page, 'div[data-testid="product-grid"]', site="shoppers", label="product_grid")
+        with metrics.stage("wait_scroll", "shoppersdrugmart", "By Page"):
+            scroll_until_stable(page, site="shoppers")
+
+        product_grid = page.ele('xpath://div[@data-testid="product-grid"]')
         if not product_grid:
             print("Product grid not found")
             return []
 
-        html = product_grid.html
-        sel = Selector(text=html)
-
-        scraped_data = []
-        products = sel.css('div.chakra-linkbox')
-
-        price_re = re.compile(r'\$\s*\d{1,3}(?:[,\d{3}]*)?(?:\.\d{1,2})?')  # matches $10.99, $1,234.56
-        # Helper
-        def extract_price_from_textnodes(text_nodes):
-            """Given a list of text nodes (e.g. ['sale', ' $10.99']), return the $ amount or None."""
-            if not text_nodes:
-                return None
-            combined = " ".join(t.strip() for t in text_nodes if t and t.strip())
-            m = price_re.search(combined)
-            if m:
-                # normalize spacing and commas kept for readability, you can strip commas if you want numeric
-                return m.group().replace(" ", "")
-            # fallback: maybe price without $ (e.g. '10.99')
-            m2 = re.search(r'\d+\.\d{2}', combined)
-            if m2:
-                return m2.group()
-            return None
-
-        for i, product in enumerate(products):
-            try:
-                title = product.css('[data-testid="product-title"]::text').get()
-                brand = product.css('[data-testid="product-brand"]::text').get()
-                img_url = product.css('[data-testid="product-image"] img::attr(src)').get()
-                product_link = product.css('a.chakra-linkbox__overlay::attr(href)').get()
-
-                # get text nodes for price and was-price (span + following text nodes)
-                price_text_nodes = product.css('p[data-testid="price"]::text').getall()
-                if not price_text_nodes:
-                    # alternate container fallback
-                    price_text_nodes = product.css('[data-testid="price-product-tile"] p[data-testid="price"]::text').getall()
-
-                was_text_nodes = product.css('p[data-testid="was-price"]::text').getall()
-                if not was_text_nodes:
-                    was_text_nodes = product.css('[data-testid="price-product-tile"] p[data-testid="was-price"]::text').getall()
-
-                price = extract_price_from_textnodes(price_text_nodes)
-                old_price = extract_price_from_textnodes(was_text_nodes)
-
-                # If price is missing but old_price exists, use old_price as price
-                if not price and old_price:
-                    price = old_price
-
-                # collect promotion badges (can be multiple)
-                promos = product.css('[data-testid="product-deal-badge"]::text').getall()
-                pco = product.css('[data-testid="product-pco-badge"]::text').getall()
-                badges = [p.strip() for p in (promos + pco) if p and p.strip()]
-                promotion_type = ", ".join(badges) if badges else None
-
-                item = {
-                    "type": "By Page",
-                    "title": title,
-                    "brand": brand,
-                    "rating": 0,
-                    "review": 0,
-                    "price": price,
-                    "old_price": old_price,
-                    "promotion_type": promotion_type,
-                    "promo_ends": None,
-                    "url": product_link,
-                    "scraped_at": datetime.now(timezone.utc).isoformat(),
-                    "img_urls": img_url,
-                }
-                save_product(item)
-                scraped_data.append(item)
-                print(f"Scraped product {i+1}: {title}")
-
-            except Exception as e:
-                print(f"Error scraping product {i+1}: {e}")
-                continue
+        with metrics.stage("extract", "shoppersdrugmart", "By Page"):
+            scraped_data = parse_product_grid(product_grid.html)
+        metrics.count("items", "shoppersdrugmart", "By Page", len(scraped_data))
+        try:
+            save_products(scraped_data)
+        except Exception as e:
+            print(f"Error saving products from {url}: {e}")
+        for i, item in enumerate(scraped_data):
+            print(f"Scraped product {i+1}: {item['title']}")
 
         print(f"Successfully scraped {len(scraped_data)} products from {url}")
         return scraped_data
 
     finally:
-        page.quit()
+        browser.release()
+        if own_browser:
+            browser.close()
 
 def main():
+    metrics.start()
     print("Choose an option:")
     print("[1] Scrape by page (e.g., 1-3, 5, 5-10)")
     print("[2] Search by URL")
 
     choice = input("Enter your choice: ")
-    scraped_data = []
     if choice == "1":
         pages_input = input("Enter pages to scrape (e.g., 1-3, 5, 5-10): ")
-        pages = parse_page_input(pages_input)
-        scraped_data = scrape_by_page(pages)
-    
+        run_shoppers(pages=parse_page_input(pages_input))
+
     elif choice == "2":
         filename = input("Enter text file with URLs: ").strip()
-        scraped_data = scrape_urls_from_file(filename)
+        run_shoppers(url_file=filename)
+
+    log_stats()
+    close_pool()
+
+def run_shoppers(pages=None, url_file=None, output="scraped_products.json", tabs=URL_TABS):
+    """Scrape listing pages or a file of product URLs without prompting; returns the products."""
+    if url_file:
+        scraped_data = scrape_urls_from_file(url_file, tabs)
+    else:
+        scraped_data = scrape_by_page(pages or [])
+
+    log_wait_stats()
+    log_change_stats()
+    resource_blocking.log_stats()
 
     # Save scraped data to a JSON file
-    with open("scraped_products.json", "w", encoding="utf-8") as f:
-        json.dump(scraped_data, f, ensure_ascii=False, indent=2)
-    
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(scraped_data, f, ensure_ascii=False, indent=2)
+
     print(f"Successfully scraped {len(scraped_data)} products")
+    return scraped_data
 
 def parse_page_input(input_str):
     pages = []
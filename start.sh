@@ -10,8 +10,16 @@ XVFB_PID=$!
 # Give Xvfb a moment to initialize
 sleep 2
 
-# Run the Python scraper
-python checkscrape.py
+# Run the Python scraper, or pull tasks from the shared work queue
+# (QUEUE_WORKER=visions|canadacomputers|shoppers) when set, or run every
+# retailer side by side from a runner config (RUNNER_CONFIG=/path/jobs.json)
+if [ -n "$QUEUE_WORKER" ]; then
+    python work_queue.py work "$QUEUE_WORKER"
+elif [ -n "$RUNNER_CONFIG" ]; then
+    python runner.py --config "$RUNNER_CONFIG"
+else
+    python checkscrape.py
+fi
 
 # Kill Xvfb after script finishes
 kill $XVFB_PID
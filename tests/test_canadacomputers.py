@@ -0,0 +1,117 @@
+import os
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import pytest
+
+import canadacomputers
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "..", "fixtures", "canadacomputers", "page.html")
+
+
+class StandIn(BaseHTTPRequestHandler):
+    """Serves the recorded page for pages 1..last_page and an empty body past them."""
+
+    last_page = 3
+    failures = {}  # page -> status codes to answer before serving the page
+    requests = []
+
+    def do_GET(self):
+        page = int(parse_qs(urlparse(self.path).query)["page"][0])
+        StandIn.requests.append(page)
+        pending = StandIn.failures.get(page)
+        if pending:
+            self.send_response(pending.pop(0))
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        with open(FIXTURE, "rb") as f:
+            body = f.read() if page <= StandIn.last_page else b""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stand_in(monkeypatch):
+    StandIn.failures = {}
+    StandIn.requests = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandIn)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(canadacomputers, "RETRY_BACKOFF", 0.01)
+    yield f"http://127.0.0.1:{server.server_address[1]}/en/clearance"
+    server.shutdown()
+    server.server_close()
+
+
+def run(base_url, **kwargs):
+    saved = []
+    stats = asyncio.run(canadacomputers.scrape_pages_async(
+        base_url=base_url, concurrency=2, rate=100, on_page=saved.append, **kwargs))
+    return stats, saved
+
+
+def test_fetches_until_first_empty_page(stand_in):
+    stats, saved = run(stand_in)
+    assert stats["pages"] == 3
+    assert stats["products"] == 3 * 24
+    assert stats["errors"] == 0
+    assert all(len(products) == 24 for products in saved)
+
+
+def test_transient_errors_are_retried(stand_in):
+    StandIn.failures = {2: [503, 500]}
+    stats, saved = run(stand_in, end=3)
+    assert stats["pages"] == 3
+    assert stats["retries"] == 2
+    assert stats["failed_pages"] == []
+    assert StandIn.requests.count(2) == 3
+
+
+def test_pages_that_keep_failing_are_reported(stand_in):
+    StandIn.failures = {2: [503] * (canadacomputers.FETCH_RETRIES + 1)}
+    stats, saved = run(stand_in, end=3)
+    assert stats["pages"] == 2
+    assert stats["failed_pages"] == [2]
+
+
+def test_client_errors_are_not_retried(stand_in):
+    StandIn.failures = {1: [404]}
+    stats, saved = run(stand_in, end=1)
+    assert stats["failed_pages"] == [1]
+    assert StandIn.requests.count(1) == 1
+
+
+def test_unchanged_pages_are_marked_seen(stand_in, tmp_path):
+    from http_cache import HttpCache
+    cache = HttpCache(str(tmp_path / "http_cache.sqlite3"))
+    try:
+        first, saved = run(stand_in, end=2, cache=cache, on_seen=lambda urls: None)
+        assert first["pages"] == 2
+
+        seen = []
+        second, saved = run(stand_in, end=2, cache=cache, on_seen=seen.append)
+    finally:
+        cache.close()
+    assert saved == []
+    assert second["unchanged_pages"] == 2
+    assert len(seen) == 2
+    assert all(len(urls) == 24 and all(urls) for urls in seen)
+
+
+def test_failed_writes_are_reported(stand_in):
+    def on_page(products):
+        raise RuntimeError("database is down")
+
+    stats = asyncio.run(canadacomputers.scrape_pages_async(
+        base_url=stand_in, end=2, concurrency=2, rate=100, on_page=on_page))
+    assert stats["pages"] == 0
+    assert stats["errors"] == 2
+    assert stats["failed_pages"] == [1, 2]
@@ -0,0 +1,72 @@
+import os
+import json
+
+import shoppersdrugmart
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "..", "fixtures", "shoppers", "pdp.html")
+URL = "https://shop.shoppersdrugmart.ca/webber-melatonin-extra-strength-quick-dissolve-5-mg/p/BB_625273036466"
+
+
+def read_fixture():
+    with open(FIXTURE, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def without_timestamp(item):
+    return {k: v for k, v in item.items() if k != "scraped_at"}
+
+
+def page_with(product):
+    return f'<html><head><script type="application/ld+json">{json.dumps(product)}</script></head></html>'
+
+
+def test_structured_and_dom_paths_agree():
+    html = read_fixture()
+    structured = shoppersdrugmart.parse_structured_data(html, URL)
+    dom = shoppersdrugmart.parse_product_page(html, URL)
+    assert structured is not None
+    assert without_timestamp(structured) == without_timestamp(dom)
+    assert structured["review"] == "212"
+    assert structured["old_price"] == "$17.99"
+
+
+def test_missing_structured_data_falls_back_to_dom():
+    html = read_fixture().replace("application/ld+json", "text/plain")
+    assert shoppersdrugmart.parse_structured_data(html, URL) is None
+    item = shoppersdrugmart.extract_product(html, URL)
+    assert item["title"] == "Melatonin Extra Strength Quick Dissolve 5 mg"
+
+
+def test_rating_list_and_single_price_specification():
+    html = page_with({
+        "@type": "Product", "name": "Lip Balm", "brand": "Burt's Bees",
+        "aggregateRating": [{"@type": "AggregateRating", "ratingValue": 5, "reviewCount": "1,024"}],
+        "offers": {"@type": "Offer", "price": 4.5, "priceSpecification": {
+            "@type": "UnitPriceSpecification", "priceType": "https://schema.org/StrikethroughPrice", "price": "5.99"}},
+    })
+    item = shoppersdrugmart.parse_structured_data(html, URL)
+    assert item["rating"] == "5.0"
+    assert item["review"] == "1024"
+    assert item["price"] == "$4.50"
+    assert item["old_price"] == "$5.99"
+
+
+def test_unreadable_structured_data_returns_none():
+    html = page_with({"@type": "Product", "name": "Odd", "aggregateRating": ["not a rating"]})
+    assert shoppersdrugmart.parse_structured_data(html, URL) is None
+
+
+def test_http_page_without_price_is_left_for_browser(monkeypatch):
+    class Response:
+        status_code = 200
+        text = page_with({"@type": "Product", "name": "Lip Balm", "brand": "Burt's Bees", "offers": {"@type": "Offer"}})
+
+    monkeypatch.setattr(shoppersdrugmart.http_session, "get", lambda url, timeout: Response())
+    assert shoppersdrugmart.fetch_product_page(URL) is None
+
+
+def test_unparseable_price_has_no_discount():
+    row = dict(zip(shoppersdrugmart.SHOPPERS_COLUMNS,
+                   shoppersdrugmart.product_row({"title": "Lip Balm", "price": "See in store", "old_price": "$5.99"})))
+    assert row["price"] is None
+    assert row["percentage_discount"] == 0 and row["dollar_discount"] == 0
@@ -0,0 +1,25 @@
+import os
+
+import visions_parser
+
+FIXTURE = os.path.join(visions_parser.GOLDEN_DIR, "grid.html")
+
+
+def test_parser_matches_golden_output():
+    assert visions_parser.check_golden() == []
+
+
+def test_clearance_out_of_stock_and_unrated_tiles():
+    with open(FIXTURE, "r", encoding="utf-8") as f:
+        products = {p["url"]: p for p in visions_parser.parse_product_grid(f.read(), "Television")}
+
+    clearance = products["https://www.visions.ca/tcl-55-qled-clearance"]
+    assert (clearance["current_price"], clearance["regular_price"]) == ("$449.99", "$699.99")
+    assert (clearance["percentage_discount"], clearance["dollar_discount"]) == ("35.7%", "250.00")
+
+    out_of_stock = products["https://www.visions.ca/bose-quietcomfort-earbuds"]
+    assert out_of_stock["current_price"] == out_of_stock["regular_price"] == "N/A"
+    assert out_of_stock["percentage_discount"] == "N/A"
+
+    unrated = products["https://www.visions.ca/panasonic-microwave"]
+    assert (unrated["num_reviews"], unrated["avg_rating"]) == ("5", "N/A")
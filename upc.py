@@ -0,0 +1,235 @@
+import os
+import time
+import queue
+import sqlite3
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import lxml.html
+from db import get_connection
+import resource_blocking
+
+# UPC lookup tuning
+UPC_TABS = int(os.getenv("UPC_TABS", 4))
+UPC_TIMEOUT = float(os.getenv("UPC_TIMEOUT", 10))
+UPC_XPATH = "xpath://strong[contains(text(), 'UPC')]/following-sibling::div"
+UPC_LXML_XPATH = UPC_XPATH.split(":", 1)[1]
+
+# UPC cache
+UPC_CACHE_PATH = os.getenv("UPC_CACHE_PATH", "upc_cache.sqlite3")
+UPC_MISS_TTL = float(os.getenv("UPC_MISS_TTL_HOURS", 24)) * 3600
+
+
+def parse_upc(html):
+    """UPC from a product page's HTML (str or bytes), or None if the page has none."""
+    upc_ele = lxml.html.fromstring(html).xpath(UPC_LXML_XPATH)
+    if upc_ele:
+        return upc_ele[0].text_content().strip()
+    return None
+
+
+class UpcCache:
+    """
+    On-disk URL -> UPC map. Real UPCs never expire; "N/A" misses (the page loaded
+    but had no UPC) are retried once they are older than UPC_MISS_TTL. Failed
+    lookups are never stored.
+    """
+
+    def __init__(self, path=UPC_CACHE_PATH, miss_ttl=UPC_MISS_TTL):
+        self.miss_ttl = miss_ttl
+        self.conn = sqlite3.connect(path, timeout=30)  # parallel workers share the file
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS upc_cache (
+                url TEXT PRIMARY KEY,
+                upc TEXT NOT NULL,
+                fetched_at REAL NOT NULL
+            )
+        """)
+        self.conn.commit()
+
+    def get_many(self, urls):
+        """Return {url: upc} for the URLs that have a usable cached value."""
+        urls = list(urls)
+        hits = {}
+        cutoff = time.time() - self.miss_ttl
+        # stay under SQLite's bound-parameter limit
+        for i in range(0, len(urls), 500):
+            chunk = urls[i:i + 500]
+            rows = self.conn.execute(
+                f"SELECT url, upc, fetched_at FROM upc_cache WHERE url IN ({','.join('?' * len(chunk))})",
+                chunk,
+            )
+            for url, upc, fetched_at in rows:
+                if upc != "N/A" or fetched_at >= cutoff:
+                    hits[url] = upc
+        return hits
+
+    def put_many(self, results):
+        now = time.time()
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO upc_cache (url, upc, fetched_at) VALUES (?, ?, ?)",
+            [(url, upc, now) for url, upc in results.items()],
+        )
+        self.conn.commit()
+
+    def warm_from_db(self):
+        """Seed the cache with UPCs already stored in the visions table."""
+        with get_connection() as conn, conn.cursor() as cur:
+            cur.execute("""
+                SELECT DISTINCT ON (url) url, upc FROM visions
+                WHERE upc IS NOT NULL AND upc <> 'N/A'
+                ORDER BY url, created_at DESC
+            """)
+            rows = cur.fetchall()
+        self.put_many(dict(rows))
+        logging.info(f"UPC cache warmed with {len(rows)} URLs from visions")
+        return len(rows)
+
+    def close(self):
+        self.conn.close()
+
+
+class UpcTabPool:
+    """
+    Resolve product UPCs with a fixed set of reusable tabs on one ChromiumPage.
+    Each tab pulls URLs from a shared queue and reads the UPC as soon as the
+    element appears (or gives up after UPC_TIMEOUT seconds).
+    """
+
+    kind = "tab pool"
+
+    def __init__(self, driver, size=UPC_TABS, timeout=UPC_TIMEOUT, cache=None):
+        self.driver = driver
+        self.size = max(1, size)
+        self.timeout = timeout
+        self.cache = cache
+        self.stats = {"requested": 0, "cache_hits": 0, "found": 0, "missing": 0, "errors": 0, "seconds": 0.0}
+        self._lock = threading.Lock()
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self.stats[key] += amount
+
+    def _lookup(self, tab, url):
+        """The UPC, "N/A" when the page has none, or None when the page couldn't be read."""
+        try:
+            if tab.get(url, timeout=self.timeout) is False:
+                raise RuntimeError("page did not load")
+            upc_ele = tab.ele(UPC_XPATH, timeout=self.timeout)
+            if upc_ele:
+                self._count("found")
+                return upc_ele.text
+            self._count("missing")
+        except Exception as e:
+            logging.debug(f"UPC lookup failed for {url}: {e}")
+            self._count("errors")
+            return None
+        return "N/A"
+
+    def _worker(self, tab, urls, results):
+        while True:
+            try:
+                url = urls.get_nowait()
+            except queue.Empty:
+                return
+            results[url] = self._lookup(tab, url)
+
+    def _fetch(self, pending):
+        fetched = {}
+        work = queue.Queue()
+        for url in pending:
+            work.put(url)
+
+        tabs = []
+        try:
+            # tabs are created up front on the calling thread, then handed to workers
+            for _ in range(min(self.size, len(pending))):
+                tab = self.driver.new_tab()
+                tab.set.load_mode.eager()  # DOM is enough, don't wait for images/scripts
+                resource_blocking.enable(tab, "detail")
+                tabs.append(tab)
+
+            workers = [
+                threading.Thread(target=self._worker, args=(tab, work, fetched), daemon=True)
+                for tab in tabs
+            ]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+        finally:
+            for tab in tabs:
+                try:
+                    tab.close()
+                except Exception:
+                    pass
+        return fetched
+
+    def fetch_all(self, urls):
+        """Return {url: upc} for every URL, "N/A" when the UPC can't be read (failed lookups aren't cached)."""
+        pending = list(dict.fromkeys(u for u in urls if u and u != "N/A"))
+        results = {}
+        if self.cache is not None and pending:
+            results = self.cache.get_many(pending)
+            self._count("cache_hits", len(results))
+            pending = [u for u in pending if u not in results]
+        if not pending:
+            return results
+
+        started = time.monotonic()
+        fetched = self._fetch(pending)
+        if self.cache is not None:
+            # only real UPCs and genuine misses; errors are retried on the next run
+            self.cache.put_many({url: upc for url, upc in fetched.items() if upc is not None})
+        results.update({url: "N/A" if upc is None else upc for url, upc in fetched.items()})
+
+        elapsed = time.monotonic() - started
+        self._count("requested", len(pending))
+        self._count("seconds", elapsed)
+        logging.info(
+            f"UPC {self.kind}: {len(pending)} URLs with {min(self.size, len(pending))} workers in {elapsed:.1f}s "
+            f"({len(pending) / elapsed if elapsed else 0:.2f} URLs/sec)"
+        )
+        return results
+
+    def log_stats(self):
+        s = self.stats
+        rate = s["requested"] / s["seconds"] if s["seconds"] else 0
+        logging.info(
+            f"UPC totals: {s['cache_hits']} cache hits, {s['requested']} fetched, "
+            f"{s['found']} found, {s['missing']} missing, "
+            f"{s['errors']} errors, {rate:.2f} URLs/sec"
+        )
+
+
+class UpcHttpPool(UpcTabPool):
+    """
+    Same interface as UpcTabPool, but reads product pages over a plain
+    requests session (e.g. one carrying Cloudflare clearance cookies).
+    """
+
+    kind = "http pool"
+
+    def __init__(self, session, size=UPC_TABS, timeout=UPC_TIMEOUT, cache=None):
+        super().__init__(None, size=size, timeout=timeout, cache=cache)
+        self.session = session
+
+    def _lookup(self, session, url):
+        try:
+            resp = session.get(url, timeout=self.timeout)
+            resp.raise_for_status()
+            upc = parse_upc(resp.content)
+            if upc is not None:
+                self._count("found")
+                return upc
+            self._count("missing")
+        except Exception as e:
+            logging.debug(f"UPC lookup failed for {url}: {e}")
+            self._count("errors")
+            return None
+        return "N/A"
+
+    def _fetch(self, pending):
+        with ThreadPoolExecutor(max_workers=min(self.size, len(pending))) as executor:
+            upcs = executor.map(lambda url: self._lookup(self.session, url), pending)
+            return dict(zip(pending, upcs))
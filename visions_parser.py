@@ -0,0 +1,244 @@
+import re
+import os
+import sys
+import json
+import logging
+from lxml import etree
+from lxml.etree import XPath
+
+# Single-pass lxml parser for Visions product grids.
+# Produces the same dicts as checkscrape.extract_product_data (with upc left as "N/A").
+
+def _has_class(name):
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+TILE_CLASSES = {"item", "product", "product-item"}
+PRICE_WRAPPER = XPath(f".//span[{_has_class('price-wrapper')}]")
+
+# (tag, class token) pairs collected in one walk over each tile
+TILE_FIELDS = {
+    ("a", "product-item-link"),
+    ("span", "special-price"),
+    ("span", "old-price"),
+    ("span", "price-wrapper"),
+    ("span", "vision-tier-price"),
+    ("div", "pr-category-snippet__total"),
+    ("div", "pr-snippet-rating-decimal"),
+    ("div", "rw-grid-date"),
+}
+FIELD_CLASSES = {cls for _, cls in TILE_FIELDS}
+
+HTML_PARSER = etree.HTMLParser()
+
+MODEL_RE = re.compile(r'\(([^()]+)\)')
+SAVE_RE = re.compile(r'Save\$(.+)')
+NON_NUMERIC_RE = re.compile(r'[^\d.]')
+
+GOLDEN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "visions")
+
+
+def extract_model(text):
+    matches = MODEL_RE.findall(text)  # only matches non-nested parentheses
+    if matches:
+        return matches[-1].strip()  # take the last one
+    return "N/A"
+
+def _first(xpath, node):
+    found = xpath(node)
+    return found[0] if found else None
+
+def _scan(tile):
+    """Walk the tile once and keep the first element for each (tag, class) of interest."""
+    found = {}
+    for el in tile.iterdescendants():
+        cls = el.get("class")
+        if not cls:
+            continue
+        for token in cls.split():
+            if token in FIELD_CLASSES and token not in found and (el.tag, token) in TILE_FIELDS:
+                found[token] = el
+    return found
+
+def _text(node):
+    """Equivalent of BeautifulSoup's get_text(strip=True)."""
+    return "".join(t.strip() for t in node.itertext())
+
+def tile_record(tile):
+    """Raw text fields of one lxml tile, in the same shape TILE_RECORDS_JS returns."""
+    found = _scan(tile)
+    link = found.get("product-item-link")
+    special = found.get("special-price")
+    old = found.get("old-price")
+    special_wrapper = _first(PRICE_WRAPPER, special) if special is not None else None
+    old_wrapper = _first(PRICE_WRAPPER, old) if old is not None else None
+    final = found.get("price-wrapper")
+    tier = found.get("vision-tier-price")
+    reviews = found.get("pr-category-snippet__total")
+    rating = found.get("pr-snippet-rating-decimal")
+    sale_ends = found.get("rw-grid-date")
+    return {
+        "has_link": link is not None,
+        "href": link.get("href") if link is not None else None,
+        "title": _text(link) if link is not None else None,
+        "special_price": _text(special_wrapper) if special_wrapper is not None else None,
+        "has_old_price": old is not None,
+        "old_price": _text(old_wrapper) if old_wrapper is not None else None,
+        "final_price": _text(final) if final is not None else None,
+        "tier_price": _text(tier) if tier is not None else None,
+        "reviews": _text(reviews) if reviews is not None else None,
+        "rating": _text(rating) if rating is not None else None,
+        "sale_ends": _text(sale_ends) if sale_ends is not None else None,
+    }
+
+def product_from_record(record, category):
+    """Normalize a raw tile record into the extract_product_data dict (upc left as "N/A")."""
+    try:
+        url = record["href"] if record["has_link"] else "N/A"
+        title = record["title"] if record["has_link"] else "N/A"
+        brand = title.split(' ')[0] if title != "N/A" else "N/A"
+        model = extract_model(title)
+
+        current_price = record["special_price"] if record["special_price"] is not None else "N/A"
+        if record["has_old_price"]:
+            regular_price = record["old_price"] if record["old_price"] is not None else "N/A"
+        else:
+            regular_price = record["final_price"] if record["final_price"] is not None else "N/A"
+
+        if current_price == "N/A" and regular_price != "N/A":
+            current_price = regular_price
+        elif regular_price == "N/A" and current_price != "N/A":
+            regular_price = current_price
+
+        if record["tier_price"] is not None:
+            dollar_discount_match = SAVE_RE.search(record["tier_price"])
+            dollar_discount = dollar_discount_match.group(1) if dollar_discount_match else "N/A"
+        else:
+            dollar_discount = "N/A"
+
+        if current_price != "N/A" and regular_price != "N/A":
+            try:
+                current_num = float(NON_NUMERIC_RE.sub('', current_price))
+                regular_num = float(NON_NUMERIC_RE.sub('', regular_price))
+                percentage_discount = f"{((regular_num - current_num) / regular_num * 100):.1f}%"
+            except Exception:
+                percentage_discount = "N/A"
+        else:
+            percentage_discount = "N/A"
+
+        num_reviews = record["reviews"].replace('Reviews', '').strip() if record["reviews"] is not None else "0"
+        if not num_reviews or num_reviews.lower().startswith("No"):
+            num_reviews = "0"
+
+        avg_rating = record["rating"] if record["rating"] is not None else "N/A"
+        sale_ends = record["sale_ends"].replace('Sale Ends: ', '') if record["sale_ends"] is not None else "N/A"
+
+        return {
+            'url': url,
+            'title': title,
+            'brand': brand,
+            'model': model,
+            'current_price': current_price,
+            'regular_price': regular_price,
+            'percentage_discount': percentage_discount,
+            'dollar_discount': dollar_discount,
+            'eco_fee': "N/A",  # This site doesn't seem to display eco fees
+            'num_reviews': num_reviews,
+            'avg_rating': avg_rating,
+            'main_category': category,
+            'sale_ends': sale_ends,
+            'upc': "N/A",
+        }
+    except Exception as e:
+        logging.error(f"Error extracting product data: {e}")
+        return None
+
+def parse_tile(tile, category):
+    """Extract one product dict from an lxml <li> tile element."""
+    try:
+        record = tile_record(tile)
+    except Exception as e:
+        logging.error(f"Error extracting product data: {e}")
+        return None
+    return product_from_record(record, category)
+
+# Runs inside the page: builds the same records as tile_record() and returns them as one JSON string
+TILE_RECORDS_JS = """
+const text = (el) => {
+    if (!el) return null;
+    const walker = document.createTreeWalker(el, NodeFilter.SHOW_TEXT);
+    let out = "";
+    while (walker.nextNode()) out += walker.currentNode.nodeValue.trim();
+    return out;
+};
+const records = Array.from(document.querySelectorAll('li.item.product.product-item')).map(tile => {
+    const link = tile.querySelector('a.product-item-link');
+    const special = tile.querySelector('span.special-price');
+    const old = tile.querySelector('span.old-price');
+    return {
+        has_link: !!link,
+        href: link ? link.getAttribute('href') : null,
+        title: text(link),
+        special_price: special ? text(special.querySelector('span.price-wrapper')) : null,
+        has_old_price: !!old,
+        old_price: old ? text(old.querySelector('span.price-wrapper')) : null,
+        final_price: text(tile.querySelector('span.price-wrapper')),
+        tier_price: text(tile.querySelector('span.vision-tier-price')),
+        reviews: text(tile.querySelector('div.pr-category-snippet__total')),
+        rating: text(tile.querySelector('div.pr-snippet-rating-decimal')),
+        sale_ends: text(tile.querySelector('div.rw-grid-date')),
+    };
+});
+return JSON.stringify(records);
+"""
+
+def parse_tile_records(records_json, category):
+    """Normalize the JSON array returned by TILE_RECORDS_JS into product dicts."""
+    for record in json.loads(records_json or "[]"):
+        product = product_from_record(record, category)
+        if product:
+            yield product
+
+def parse_product_grid(html_text, category):
+    """Parse a whole grid (or page) once and yield a product dict per tile."""
+    if not html_text or not html_text.strip():
+        return
+    root = etree.fromstring(html_text, HTML_PARSER)
+    for tile in root.iter("li"):
+        if not TILE_CLASSES.issubset((tile.get("class") or "").split()):
+            continue
+        product = parse_tile(tile, category)
+        if product:
+            yield product
+
+def parse_product_tiles(tile_htmls, category):
+    """Parse a list of tile outerHTML strings in a single lxml pass."""
+    if not tile_htmls:
+        return iter(())
+    return parse_product_grid("<ol>" + "".join(tile_htmls) + "</ol>", category)
+
+
+def check_golden(golden_dir=GOLDEN_DIR):
+    """
+    Compare the parser output for every fixtures/visions/<name>.html against
+    <name>.expected.json (recorded from extract_product_data). Returns the mismatches.
+    """
+    mismatches = []
+    for name in sorted(os.listdir(golden_dir)):
+        if not name.endswith(".html"):
+            continue
+        with open(os.path.join(golden_dir, name), "r", encoding="utf-8") as f:
+            html_text = f.read()
+        with open(os.path.join(golden_dir, name[:-5] + ".expected.json"), "r", encoding="utf-8") as f:
+            expected = json.load(f)
+        actual = list(parse_product_grid(html_text, expected["category"]))
+        if actual != expected["products"]:
+            mismatches.append(name)
+    return mismatches
+
+
+if __name__ == "__main__":
+    failed = check_golden()
+    if failed:
+        print(f"Golden mismatch: {', '.join(failed)}")
+        sys.exit(1)
+    print("Visions parser matches golden output.")
@@ -0,0 +1,140 @@
+import os
+import json
+import time
+import logging
+import threading
+
+# Default timeouts (seconds) per site and wait kind.
+# Override any of them with WAIT_<SITE>_<KIND>, e.g. WAIT_VISIONS_SCROLL=6
+WAIT_TIMEOUTS = {
+    "visions": {"page_load": 20, "scroll": 6, "spinner": 10, "network_idle": 8},
+    "shoppers": {"page_load": 20, "scroll": 5, "spinner": 10, "network_idle": 8},
+    "default": {"page_load": 15, "scroll": 5, "spinner": 10, "network_idle": 8},
+}
+POLL_INTERVAL = float(os.getenv("WAIT_POLL_INTERVAL", 0.2))
+
+_stats_lock = threading.Lock()
+wait_stats = {}  # label -> {"count", "seconds", "max", "timeouts"}
+
+
+def timeout_for(site, kind):
+    env = os.getenv(f"WAIT_{site.upper()}_{kind.upper()}")
+    if env:
+        return float(env)
+    return WAIT_TIMEOUTS.get(site, WAIT_TIMEOUTS["default"]).get(kind, WAIT_TIMEOUTS["default"][kind])
+
+
+def _record(label, seconds, timed_out):
+    with _stats_lock:
+        s = wait_stats.setdefault(label, {"count": 0, "seconds": 0.0, "max": 0.0, "timeouts": 0})
+        s["count"] += 1
+        s["seconds"] += seconds
+        s["max"] = max(s["max"], seconds)
+        if timed_out:
+            s["timeouts"] += 1
+
+
+def wait_until(condition, timeout, label, interval=POLL_INTERVAL):
+    """
+    Poll condition() until it returns a truthy value or timeout expires.
+    Returns that value (or the last falsy one) and records how long the wait took.
+    """
+    started = time.monotonic()
+    deadline = started + timeout
+    result = None
+    while True:
+        try:
+            result = condition()
+        except Exception as e:
+            logging.debug(f"Wait '{label}' check failed: {e}")
+            result = None
+        if result or time.monotonic() >= deadline:
+            break
+        time.sleep(interval)
+    _record(label, time.monotonic() - started, not result)
+    return result
+
+
+def wait_for_dom_ready(page, site="default", label="dom_ready"):
+    """Resolve once the document has finished parsing."""
+    return wait_until(
+        lambda: page.run_js("return document.readyState") in ("interactive", "complete"),
+        timeout_for(site, "page_load"), f"{site}.{label}",
+    )
+
+
+def wait_for_selector(page, css, site="default", label="selector"):
+    """Resolve once at least one element matching the CSS selector is in the DOM."""
+    return wait_until(
+        lambda: page.run_js(f"return document.querySelector({json.dumps(css)}) !== null"),
+        timeout_for(site, "page_load"), f"{site}.{label}",
+    )
+
+
+def count_elements(page, css):
+    return page.run_js(f"return document.querySelectorAll({json.dumps(css)}).length") or 0
+
+
+def wait_for_count_growth(page, css, previous, site="default", label="count_growth"):
+    """Resolve with the new count once more than `previous` elements match. Returns 0 on timeout."""
+    def grown():
+        count = count_elements(page, css)
+        return count if count > previous else 0
+    return wait_until(grown, timeout_for(site, "scroll"), f"{site}.{label}")
+
+
+def wait_for_height_change(page, previous, site="default", label="height_change"):
+    """Resolve with the new scrollHeight once it differs from `previous`. Returns None on timeout."""
+    def changed():
+        height = page.run_js("return document.body.scrollHeight")
+        return height if height != previous else None
+    return wait_until(changed, timeout_for(site, "scroll"), f"{site}.{label}")
+
+
+def wait_for_spinner_gone(page, css, site="default", label="spinner"):
+    """Resolve once no element matching the spinner selector is in the DOM."""
+    return wait_until(
+        lambda: page.run_js(f"return document.querySelector({json.dumps(css)}) === null"),
+        timeout_for(site, "spinner"), f"{site}.{label}",
+    )
+
+
+def wait_for_network_idle(page, idle=0.5, site="default", label="network_idle"):
+    """
+    Resolve once the page has been quiet for `idle` seconds: document complete
+    and no new entries in the resource timing buffer.
+    """
+    state = {"count": -1, "since": time.monotonic()}
+
+    def idle_enough():
+        ready, count = page.run_js(
+            "return [document.readyState, performance.getEntriesByType('resource').length]"
+        )
+        now = time.monotonic()
+        if ready != "complete" or count != state["count"]:
+            state["count"], state["since"] = count, now
+            return False
+        return now - state["since"] >= idle
+
+    return wait_until(idle_enough, timeout_for(site, "network_idle"), f"{site}.{label}")
+
+
+def log_wait_stats():
+    with _stats_lock:
+        for label, s in sorted(wait_stats.items()):
+            avg = s["seconds"] / s["count"] if s["count"] else 0
+            logging.info(
+                f"Wait {label}: {s['count']} waits, {s['seconds']:.1f}s total, "
+                f"avg {avg:.2f}s, max {s['max']:.2f}s, {s['timeouts']} timeouts"
+            )
+
+
+def scroll_until_stable(page, site="default", label="scroll"):
+    """Scroll to the bottom until the page height stops growing. Returns the final height."""
+    height = page.run_js("return document.body.scrollHeight")
+    while True:
+        page.run_js("window.scrollTo(0, document.body.scrollHeight);")
+        new_height = wait_for_height_change(page, height, site=site, label=label)
+        if new_height is None:
+            return height
+        height = new_height
@@ -0,0 +1,410 @@
+import os
+import sys
+import json
+import time
+import socket
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from psycopg2.extras import Json, execute_values
+from db import get_connection, log_stats, close_pool
+import metrics
+
+# Postgres-backed work queue shared by scraper workers on any host.
+#
+# Tasks are Visions categories, Canada Computers listing pages and Shoppers
+# product URLs. A worker claims tasks with FOR UPDATE SKIP LOCKED, so concurrent
+# claims never block on or hand out the same row; the claim is a lease that
+# expires if the worker dies, after which the task is handed out again. Failed
+# tasks go back to pending with a growing delay until max_attempts is reached.
+#
+#     python work_queue.py init
+#     python work_queue.py enqueue visions [category_id ...]
+#     python work_queue.py enqueue canadacomputers <first_page> <last_page>
+#     python work_queue.py enqueue shoppers <url_file>
+#     python work_queue.py work <visions | canadacomputers | shoppers>
+#     python work_queue.py status
+
+LEASE_SECONDS = int(os.getenv("QUEUE_LEASE_SECONDS", 600))
+MAX_ATTEMPTS = int(os.getenv("QUEUE_MAX_ATTEMPTS", 3))
+RETRY_DELAY = int(os.getenv("QUEUE_RETRY_DELAY", 60))  # seconds, doubled for each further attempt
+IDLE_EXIT = float(os.getenv("QUEUE_IDLE_EXIT", 0))  # once nothing is pending or leased, wait this long for new work
+POLL_SECONDS = float(os.getenv("QUEUE_POLL_SECONDS", 10))
+WORKER_ID = os.getenv("QUEUE_WORKER_ID") or f"{socket.gethostname()}:{os.getpid()}"
+
+KINDS = ("category", "page", "url")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scrape_tasks (
+    id BIGSERIAL PRIMARY KEY,
+    retailer TEXT NOT NULL,
+    kind TEXT NOT NULL,                        -- category | page | url
+    task_key TEXT NOT NULL,                    -- category id, page number or URL
+    payload JSONB NOT NULL DEFAULT '{}',
+    priority INTEGER NOT NULL DEFAULT 0,       -- higher is claimed first
+    status TEXT NOT NULL DEFAULT 'pending',    -- pending | leased | done | failed
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 3,
+    available_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    lease_owner TEXT,
+    lease_expires_at TIMESTAMPTZ,
+    last_error TEXT,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    UNIQUE (retailer, kind, task_key)
+);
+CREATE INDEX IF NOT EXISTS scrape_tasks_claim_idx
+    ON scrape_tasks (retailer, kind, priority DESC, id) WHERE status IN ('pending', 'leased');
+"""
+
+
+# Producers
+
+def enqueue(cur, retailer, kind, tasks, priority=0, max_attempts=MAX_ATTEMPTS, requeue=True):
+    """
+    Add (task_key, payload) tasks. Existing tasks are left alone while pending or
+    leased; finished or failed ones are reset when `requeue` is set. Returns the
+    number of rows inserted or reset.
+    """
+    if kind not in KINDS:
+        raise ValueError(f"unknown task kind: {kind}")
+    rows = [(retailer, kind, str(key), Json(payload), priority, max_attempts) for key, payload in tasks]
+    if not rows:
+        return 0
+    conflict = """
+        DO UPDATE SET status = 'pending', attempts = 0, available_at = now(), last_error = NULL,
+            payload = EXCLUDED.payload, priority = EXCLUDED.priority,
+            max_attempts = EXCLUDED.max_attempts, updated_at = now()
+        WHERE scrape_tasks.status IN ('done', 'failed')
+    """ if requeue else "DO NOTHING"
+    written = execute_values(cur, f"""
+        INSERT INTO scrape_tasks (retailer, kind, task_key, payload, priority, max_attempts)
+        VALUES %s
+        ON CONFLICT (retailer, kind, task_key) {conflict}
+        RETURNING id
+    """, rows, page_size=500, fetch=True)
+    return len(written)
+
+
+# Consumers
+
+def claim(retailer, kind, limit=1, worker=WORKER_ID, lease_seconds=LEASE_SECONDS):
+    """
+    Lease up to `limit` runnable tasks: pending ones that are due, and leased ones
+    whose lease has expired. Returns a list of task dicts (id, task_key, payload, attempts).
+    """
+    with get_connection() as conn, conn.cursor() as cur:
+        cur.execute("""
+            WITH runnable AS (
+                SELECT id FROM scrape_tasks
+                WHERE retailer = %s AND kind = %s AND attempts < max_attempts
+                  AND ((status = 'pending' AND available_at <= now())
+                       OR (status = 'leased' AND lease_expires_at < now()))
+                ORDER BY priority DESC, id
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            )
+            UPDATE scrape_tasks t SET
+                status = 'leased', lease_owner = %s,
+                lease_expires_at = now() + make_interval(secs => %s),
+                attempts = t.attempts + 1, updated_at = now()
+            FROM runnable WHERE t.id = runnable.id
+            RETURNING t.id, t.task_key, t.payload, t.attempts, t.priority
+        """, (retailer, kind, limit, worker, lease_seconds))
+        tasks = [
+            {"id": tid, "task_key": key, "payload": payload, "attempts": attempts, "priority": priority}
+            for tid, key, payload, attempts, priority in cur.fetchall()
+        ]
+    tasks.sort(key=lambda task: (-task["priority"], task["id"]))
+    metrics.count("queue_claimed", retailer, kind, len(tasks))
+    return tasks
+
+
+def extend(task_ids, worker=WORKER_ID, lease_seconds=LEASE_SECONDS):
+    """Heartbeat: push the lease of tasks still held by `worker` forward."""
+    if not task_ids:
+        return
+    with get_connection() as conn, conn.cursor() as cur:
+        cur.execute("""
+            UPDATE scrape_tasks SET lease_expires_at = now() + make_interval(secs => %s), updated_at = now()
+            WHERE id = ANY(%s) AND status = 'leased' AND lease_owner = %s
+        """, (lease_seconds, list(task_ids), worker))
+
+
+def complete(cur, task_ids, worker=WORKER_ID):
+    """
+    Mark tasks done on the caller's cursor, so it can share the transaction that
+    wrote their results. A task whose lease was lost to another worker is left alone.
+    """
+    if not task_ids:
+        return 0
+    cur.execute("""
+        UPDATE scrape_tasks SET status = 'done', lease_owner = NULL, lease_expires_at = NULL,
+            last_error = NULL, updated_at = now()
+        WHERE id = ANY(%s) AND status = 'leased' AND lease_owner = %s
+    """, (list(task_ids), worker))
+    return cur.rowcount
+
+
+def fail(task_ids, error, worker=WORKER_ID, retry_delay=RETRY_DELAY):
+    """Release tasks after an error: back to pending with backoff, or failed once out of attempts."""
+    if not task_ids:
+        return
+    with get_connection() as conn, conn.cursor() as cur:
+        cur.execute("""
+            UPDATE scrape_tasks SET
+                status = CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'pending' END,
+                available_at = now() + make_interval(secs => %s * power(2, GREATEST(attempts - 1, 0))),
+                lease_owner = NULL, lease_expires_at = NULL,
+                last_error = left(%s, 2000), updated_at = now()
+            WHERE id = ANY(%s) AND status = 'leased' AND lease_owner = %s
+        """, (retry_delay, str(error), list(task_ids), worker))
+
+
+@contextmanager
+def heartbeat(held, worker=WORKER_ID, lease_seconds=LEASE_SECONDS):
+    """Extend the leases of the task ids returned by held() every third of a lease while the body runs."""
+    stop = threading.Event()
+
+    def beat():
+        while not stop.wait(lease_seconds / 3):
+            try:
+                extend(held(), worker, lease_seconds)
+            except Exception as e:
+                logging.warning(f"Could not extend task leases: {e}")
+
+    thread = threading.Thread(target=beat, name="queue-heartbeat", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def reap_expired():
+    """Mark leased tasks that expired on their last attempt as failed; returns how many."""
+    with get_connection() as conn, conn.cursor() as cur:
+        cur.execute("""
+            UPDATE scrape_tasks SET status = 'failed', lease_owner = NULL, lease_expires_at = NULL,
+                last_error = COALESCE(last_error, 'lease expired'), updated_at = now()
+            WHERE status = 'leased' AND lease_expires_at < now() AND attempts >= max_attempts
+        """)
+        return cur.rowcount
+
+
+def status_counts():
+    """{(retailer, kind): {status: count}}"""
+    with get_connection() as conn, conn.cursor() as cur:
+        cur.execute("SELECT retailer, kind, status, COUNT(*) FROM scrape_tasks GROUP BY 1, 2, 3 ORDER BY 1, 2, 3")
+        counts = {}
+        for retailer, kind, status, n in cur.fetchall():
+            counts.setdefault((retailer, kind), {})[status] = n
+        return counts
+
+
+def outstanding(retailer, kind, worker=WORKER_ID):
+    """Tasks that may still become runnable: pending (possibly backing off) or leased by another worker."""
+    with get_connection() as conn, conn.cursor() as cur:
+        cur.execute("""
+            SELECT COUNT(*) FROM scrape_tasks
+            WHERE retailer = %s AND kind = %s
+              AND (status = 'pending' OR (status = 'leased' AND lease_owner IS DISTINCT FROM %s))
+        """, (retailer, kind, worker))
+        return cur.fetchone()[0]
+
+
+def claim_loop(retailer, kind, limit=1, idle_exit=IDLE_EXIT, poll=POLL_SECONDS):
+    """
+    Yield claimed batches until no task of this retailer/kind is pending or leased
+    and none has shown up for `idle_exit` seconds. Retries waiting out their backoff
+    and tasks held by other workers keep the loop polling, so they are not stranded.
+    """
+    idle_since = None
+    while True:
+        tasks = claim(retailer, kind, limit)
+        if tasks:
+            idle_since = None
+            yield tasks
+            continue
+        reap_expired()
+        if outstanding(retailer, kind):
+            idle_since = None
+        else:
+            idle_since = idle_since or time.monotonic()
+            if time.monotonic() - idle_since >= idle_exit:
+                return
+        time.sleep(poll)
+
+
+def create_schema():
+    with get_connection() as conn, conn.cursor() as cur:
+        cur.execute(SCHEMA)
+
+
+# Retailer producers and workers (scraper modules are imported on demand)
+
+def enqueue_visions(category_ids=None, priority=0):
+    """One task per category, sharing a run_id so scrape_progress resumes a category on any host."""
+    from checkscrape import VISIONS_CATEGORIES, category_sizes
+    ids = [int(c) for c in category_ids] if category_ids else list(VISIONS_CATEGORIES)
+    run_id = "queue-" + datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+    sizes = category_sizes()
+    # largest categories first, so the long ones don't start last
+    ranked = sorted(ids, key=lambda cid: sizes.get(VISIONS_CATEGORIES[cid], 0), reverse=True)
+    tasks = [(cid, {"run_id": run_id, "id": cid, "name": VISIONS_CATEGORIES[cid]}) for cid in ranked]
+    with get_connection() as conn, conn.cursor() as cur:
+        for rank, task in enumerate(tasks):
+            enqueue(cur, "visions", "category", [task], priority=priority + len(tasks) - rank)
+    return len(tasks)
+
+
+def enqueue_canadacomputers(first_page, last_page, priority=0):
+    # earlier pages first: the listing is sorted, and a run should fill in from the front
+    with get_connection() as conn, conn.cursor() as cur:
+        return enqueue(cur, "canadacomputers", "page",
+                       [(page, {"page": page}) for page in range(first_page, last_page + 1)], priority=priority)
+
+
+def enqueue_shoppers(filename, priority=0):
+    with open(filename, "r", encoding="utf-8") as f:
+        urls = list(dict.fromkeys(line.strip() for line in f if line.strip()))
+    with get_connection() as conn, conn.cursor() as cur:
+        return enqueue(cur, "shoppers", "url", [(url, {"url": url}) for url in urls], priority=priority)
+
+
+def work_visions():
+    """Drive one browser over category tasks; scrape_progress carries the resume point between hosts."""
+    from checkscrape import run_worker
+    from checkpoint_journal import load_progress
+    batches = claim_loop("visions", "category")
+    held = {}  # category_id -> task id while it is being scraped
+    finished = []
+
+    def next_category():
+        while True:
+            tasks = next(batches, None)
+            if not tasks:
+                return None
+            task = tasks[0]
+            payload = task["payload"]
+            committed = load_progress(payload["run_id"]).get(str(payload["id"]), {})
+            if committed.get("done"):
+                with get_connection() as conn, conn.cursor() as cur:
+                    complete(cur, [task["id"]])
+                continue
+            held[str(payload["id"])] = task["id"]
+            category = {"id": payload["id"], "name": payload["name"], "run_id": payload["run_id"]}
+            return category, committed.get("product_index", 0)
+
+    def report(message):
+        if message[0] == "done" and str(message[1]) in held:
+            with get_connection() as conn, conn.cursor() as cur:
+                complete(cur, [held.pop(str(message[1]))])
+            finished.append(message[1])
+
+    with heartbeat(lambda: list(held.values())):
+        try:
+            run_worker(0, "queue", next_category, report)
+        except Exception as e:
+            fail(list(held.values()), e)
+            raise
+    fail(list(held.values()), "worker stopped before the category finished")
+    return len(finished)
+
+
+def work_canadacomputers(batch_size=10):
+    """Fetch claimed listing pages one at a time at CC_RATE_LIMIT and store them."""
+    import canadacomputers
+    pages = 0
+    for tasks in claim_loop("canadacomputers", "page", batch_size):
+        for i, task in enumerate(tasks):
+            started = time.monotonic()
+            try:
+                with metrics.stage("page_load", "canadacomputers"):
+                    products = canadacomputers.scrape_page(int(task["payload"]["page"]))
+                if products:
+                    canadacomputers.save_to_db(products)
+                with get_connection() as conn, conn.cursor() as cur:
+                    complete(cur, [task["id"]])
+                metrics.count("items", "canadacomputers", amount=len(products))
+                pages += 1
+            except Exception as e:
+                logging.warning(f"Page {task['task_key']} failed: {e}")
+                fail([task["id"]], e)
+            if i < len(tasks) - 1:
+                time.sleep(max(0.0, 1 / canadacomputers.RATE_LIMIT - (time.monotonic() - started)))
+    return pages
+
+
+def work_shoppers():
+    """
+    Scrape claimed product URLs in batches. Loaded products are written and their
+    tasks marked done in one transaction; URLs that didn't load, or whose write
+    failed, are retried through the queue.
+    """
+    import shoppersdrugmart
+    scraped = 0
+    for tasks in claim_loop("shoppers", "url", shoppersdrugmart.SAVE_BATCH_SIZE):
+        by_index = {i: task for i, task in enumerate(tasks)}
+        try:
+            with heartbeat(lambda: [t["id"] for t in tasks]):
+                loaded, pending, _ = shoppersdrugmart.scrape_urls(
+                    [(i, t["payload"]["url"]) for i, t in by_index.items()], save=False)
+        except Exception as e:
+            fail([t["id"] for t in tasks], e)
+            raise
+        fail([by_index[i]["id"] for i, _ in pending], "product data did not load")
+        if not loaded:
+            continue
+        try:
+            with get_connection() as conn, conn.cursor() as cur:
+                shoppersdrugmart.save_products([loaded[i] for i in sorted(loaded)], cur)
+                complete(cur, [by_index[i]["id"] for i in loaded])
+        except Exception as e:
+            logging.warning(f"Could not save {len(loaded)} Shoppers products: {e}")
+            fail([by_index[i]["id"] for i in loaded], e)
+            continue
+        scraped += len(loaded)
+    return scraped
+
+
+WORKERS = {
+    "visions": work_visions,
+    "canadacomputers": work_canadacomputers,
+    "shoppers": work_shoppers,
+}
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+    )
+    args = sys.argv[1:]
+    command = args[0] if args else "status"
+    try:
+        if command == "init":
+            create_schema()
+            logging.info("scrape_tasks table is ready")
+        elif command == "enqueue" and len(args) >= 2 and args[1] == "visions":
+            logging.info(f"Queued {enqueue_visions(args[2:])} Visions categories")
+        elif command == "enqueue" and len(args) == 4 and args[1] == "canadacomputers":
+            logging.info(f"Queued {enqueue_canadacomputers(int(args[2]), int(args[3]))} Canada Computers pages")
+        elif command == "enqueue" and len(args) == 3 and args[1] == "shoppers":
+            logging.info(f"Queued {enqueue_shoppers(args[2])} Shoppers URLs")
+        elif command == "work" and len(args) == 2 and args[1] in WORKERS:
+            metrics.start()
+            logging.info(f"Worker {WORKER_ID} pulling {args[1]} tasks")
+            logging.info(f"Worker {WORKER_ID} finished {WORKERS[args[1]]()} {args[1]} tasks")
+        elif command == "status":
+            for (retailer, kind), counts in status_counts().items():
+                print(f"{retailer:<16} {kind:<9} " + json.dumps(counts))
+        else:
+            print("Usage: python work_queue.py [init | enqueue <visions [ids] | canadacomputers <first> <last> "
+                  "| shoppers <url_file>> | work <visions | canadacomputers | shoppers> | status]")
+            sys.exit(2)
+    finally:
+        log_stats()
+        close_pool()